@@ -1,6 +1,10 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from .routers import weather, dish, satisfaction, dining
+from fastapi.middleware.gzip import GZipMiddleware
+from .routers import weather, dish, satisfaction, dining, employee, debug
+from .utils.sql_profiler import setup_sql_profiling
+from .utils.compression import COMPRESS_MIN_SIZE
+from .utils.comment_index import comment_index
 
 app = FastAPI()
 
@@ -13,11 +17,22 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# 其余接口的响应压缩；大屏接口已自行按数据版本缓存压缩结果（带 Content-Encoding 的响应会被跳过）
+app.add_middleware(GZipMiddleware, minimum_size=COMPRESS_MIN_SIZE)
+
 # 注册路由
 app.include_router(weather.router, prefix="/api")
 app.include_router(dish.router, prefix="/api")
 app.include_router(satisfaction.router, prefix="/api")
 app.include_router(dining.router, prefix="/api")
+app.include_router(employee.router, prefix="/api")
+if debug.DEBUG_ENDPOINTS_ENABLED:
+    app.include_router(debug.router, prefix="/api")
+
+@app.on_event("startup")
+async def startup():
+    setup_sql_profiling()
+    comment_index.warm_up()
 
 @app.get("/")
 async def root():
@@ -1,16 +1,29 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, JSON, DECIMAL
+from sqlalchemy import Column, Integer, String, Float, Date, DateTime, JSON, DECIMAL, Index
 from .database import Base
 import datetime
 
+class Employee(Base):
+    """员工维度模型（就餐记录只保存员工ID）"""
+    __tablename__ = "employees"
+
+    employee_id = Column(String(50), primary_key=True)
+    employee_name = Column(String(50))
+    avatar_url = Column(String(200))
+    created_at = Column(DateTime, default=datetime.datetime.now)
+    updated_at = Column(DateTime, default=datetime.datetime.now, onupdate=datetime.datetime.now)
+
 class DiningRecord(Base):
     """就餐记录模型"""
     __tablename__ = "dining_records"
+    __table_args__ = (
+        Index("idx_payment_time", "payment_time"),
+        Index("idx_employee_payment_time", "employee_id", "payment_time"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
-    employee_id = Column(String(50))
-    employee_name = Column(String(50))
-    avatar_url = Column(String(200))
+    employee_id = Column(String(50))   # 员工信息见 employees 表
     payment_time = Column(DateTime, default=datetime.datetime.utcnow)
+    exit_time = Column(DateTime, nullable=True)  # 出闸时间，缺失时按固定就餐时长估算
     payment_amount = Column(DECIMAL(10, 2))
     dishes = Column(JSON)
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
@@ -21,6 +34,9 @@ class DiningRecord(Base):
 class Satisfaction(Base):
     """满意度评价模型"""
     __tablename__ = "satisfaction"
+    __table_args__ = (
+        Index("idx_created_at", "created_at"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     rating = Column(Integer)          # 评分（1-5）
@@ -36,4 +52,20 @@ class DishSales(Base):
     price = Column(DECIMAL(10, 2), nullable=False)
     sales_count = Column(Integer, nullable=False)
     sales_time = Column(DateTime, nullable=False)
-    created_at = Column(DateTime, default=datetime.datetime.now)
\ No newline at end of file
+    created_at = Column(DateTime, default=datetime.datetime.now)
+
+class EmployeeMonthlyStats(Base):
+    """员工月度就餐汇总模型（随就餐记录写入增量维护）"""
+    __tablename__ = "employee_monthly_stats"
+    __table_args__ = (
+        Index("uk_employee_month", "employee_id", "month", unique=True),
+        Index("idx_month", "month"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    employee_id = Column(String(50), nullable=False)
+    month = Column(Date, nullable=False)                         # 月份（当月第一天）
+    visit_count = Column(Integer, nullable=False, default=0)     # 就餐次数
+    total_spend = Column(DECIMAL(12, 2), nullable=False, default=0)  # 消费总额
+    dish_counts = Column(JSON)                                   # 各菜品点餐次数 {菜品名: 次数}
+    updated_at = Column(DateTime, default=datetime.datetime.now, onupdate=datetime.datetime.now)
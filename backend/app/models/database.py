@@ -1,7 +1,9 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 import os
+import threading
+import time
 from dotenv import load_dotenv
 
 # 加载环境变量
@@ -13,20 +15,157 @@ DB_USER = os.getenv("DB_USER")
 DB_PASSWORD = os.getenv("DB_PASSWORD")
 DB_NAME = os.getenv("DB_NAME")
 
-# 数据库连接配置
-SQLALCHEMY_DATABASE_URL = f"mysql+pymysql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}/{DB_NAME}"
+# 数据库连接配置（主库，可用 DATABASE_URL 直接覆盖，例如本地测试使用 sqlite:///primary.db）
+SQLALCHEMY_DATABASE_URL = os.getenv(
+    "DATABASE_URL",
+    f"mysql+pymysql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}/{DB_NAME}"
+)
+
+# 只读副本连接配置（未配置时所有查询都走主库）
+REPLICA_DATABASE_URL = os.getenv("REPLICA_DATABASE_URL")
+
+# 副本延迟超过该阈值（秒）时分析查询回退到主库
+REPLICA_MAX_LAG_SECONDS = float(os.getenv("REPLICA_MAX_LAG_SECONDS", "5"))
+
+# 副本延迟检测结果的缓存时间（秒），避免每个请求都检测一次
+REPLICA_LAG_CHECK_INTERVAL = float(os.getenv("REPLICA_LAG_CHECK_INTERVAL", "2"))
+
+def _create_engine(url):
+    """按连接串创建数据库引擎"""
+    if url.startswith("sqlite"):
+        # SQLite 连接需要允许跨线程使用
+        return create_engine(url, connect_args={"check_same_thread": False})
+    return create_engine(url)
 
 # 创建数据库引擎
-engine = create_engine(SQLALCHEMY_DATABASE_URL)
+engine = _create_engine(SQLALCHEMY_DATABASE_URL)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# 创建只读副本引擎
+replica_engine = _create_engine(REPLICA_DATABASE_URL) if REPLICA_DATABASE_URL else None
+ReplicaSessionLocal = (
+    sessionmaker(autocommit=False, autoflush=False, bind=replica_engine)
+    if replica_engine is not None else None
+)
+
 # 创建基本模型类
 Base = declarative_base()
 
-# 获取数据库会话
+class ReplicaLagMonitor:
+    """副本延迟检测
+
+    MySQL 副本优先读取 SHOW REPLICA STATUS 中的 Seconds_Behind_Source；
+    其它情况（如两个 SQLite 文件模拟主从）比较主库和副本上最新一条
+    就餐记录的写入时间，两者之差即为副本落后的时间。
+
+    测量在后台线程中进行，请求只读取上一次的结果，副本无响应时不会阻塞请求；
+    结果过旧（测量一直未完成）时视为不可用。
+    """
+
+    def __init__(self, primary, replica, max_lag, check_interval):
+        self.primary = primary
+        self.replica = replica
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._checked_at = 0.0
+        self._measured_at = None
+        self._refreshing = False
+        self._lag = None
+
+    def _mysql_lag(self, conn):
+        """读取 MySQL 复制状态中的延迟秒数，无复制状态时返回 None，复制已停止时返回无穷大"""
+        for statement in ("SHOW REPLICA STATUS", "SHOW SLAVE STATUS"):
+            try:
+                row = conn.execute(text(statement)).mappings().first()
+            except Exception:
+                continue
+            if row is None:
+                return None
+            value = row.get("Seconds_Behind_Source", row.get("Seconds_Behind_Master"))
+            # 复制线程停止时该值为 NULL，副本数据不再更新
+            return float(value) if value is not None else float("inf")
+        return None
+
+    def _latest_write(self, bind):
+        """获取最新一条就餐记录的写入时间（按主键取最后一行，不扫描表）"""
+        from .canteen import DiningRecord
+        with bind.connect() as conn:
+            return conn.execute(
+                DiningRecord.__table__.select().with_only_columns(
+                    DiningRecord.created_at
+                ).order_by(DiningRecord.id.desc()).limit(1)
+            ).scalar()
+
+    def measure(self):
+        """测量副本延迟（秒），无法测量时返回 None"""
+        if self.replica.dialect.name == "mysql":
+            with self.replica.connect() as conn:
+                lag = self._mysql_lag(conn)
+            if lag is not None:
+                return lag
+
+        primary_latest = self._latest_write(self.primary)
+        replica_latest = self._latest_write(self.replica)
+        if primary_latest is None:
+            return 0.0
+        if replica_latest is None:
+            return float("inf")
+        return max((primary_latest - replica_latest).total_seconds(), 0.0)
+
+    def _refresh(self):
+        """后台线程：测量一次副本延迟"""
+        try:
+            lag = self.measure()
+        except Exception as e:
+            print(f"检测副本延迟出错: {e}")
+            lag = None
+        with self._lock:
+            self._lag = lag
+            self._measured_at = time.monotonic()
+            self._refreshing = False
+
+    def lag(self):
+        """返回上一次测量的副本延迟，超过检测间隔时在后台线程中重新测量"""
+        with self._lock:
+            now = time.monotonic()
+            if not self._refreshing and now - self._checked_at >= self.check_interval:
+                self._refreshing = True
+                self._checked_at = now
+                threading.Thread(target=self._refresh, name="replica-lag", daemon=True).start()
+            # 还没有测量结果，或测量卡住导致结果过旧时，不使用副本
+            if self._measured_at is None or now - self._measured_at > self.check_interval * 3:
+                return None
+            return self._lag
+
+    def replica_usable(self):
+        """副本延迟可测且在阈值内时才使用副本"""
+        lag = self.lag()
+        return lag is not None and lag <= self.max_lag
+
+replica_monitor = (
+    ReplicaLagMonitor(engine, replica_engine, REPLICA_MAX_LAG_SECONDS, REPLICA_LAG_CHECK_INTERVAL)
+    if replica_engine is not None else None
+)
+
+def ReadSessionLocal():
+    """创建只读会话：副本可用时走副本，否则回退到主库"""
+    if replica_monitor is not None and replica_monitor.replica_usable():
+        return ReplicaSessionLocal()
+    return SessionLocal()
+
+# 获取数据库会话（主库，用于写入）
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
-        db.close() 
\ No newline at end of file
+        db.close()
+
+# 获取只读数据库会话（分析查询，优先走副本）
+def get_read_db():
+    db = ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
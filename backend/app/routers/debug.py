@@ -0,0 +1,57 @@
+import os
+from dotenv import load_dotenv
+from fastapi import APIRouter
+from ..utils.sql_profiler import profiler, SQL_PROFILE_ENABLED
+from ..utils.single_flight import dashboard_flight
+from ..utils.compression import payload_cache
+
+# 加载环境变量
+load_dotenv()
+
+# 是否注册调试接口：接口会暴露 SQL 语句、执行计划和索引信息且没有鉴权，
+# 只在开启 SQL 性能分析或显式设置 DEBUG_ENDPOINTS 时注册
+DEBUG_ENDPOINTS_ENABLED = SQL_PROFILE_ENABLED or os.getenv("DEBUG_ENDPOINTS", "false").lower() in ("1", "true", "yes")
+
+router = APIRouter()
+
+@router.get("/debug/sql")
+async def get_sql_profile(limit: int = 20):
+    """获取 SQL 性能分析结果（语句耗时、慢查询、执行计划、索引检查）"""
+    try:
+        return {
+            "code": 200,
+            "message": "success",
+            "data": profiler.report(limit)
+        }
+    except Exception as e:
+        return {
+            "code": 500,
+            "message": f"获取 SQL 性能分析结果失败: {str(e)}"
+        }
+
+@router.post("/debug/sql/reset")
+async def reset_sql_profile():
+    """清空 SQL 性能分析统计"""
+    profiler.reset()
+    return {
+        "code": 200,
+        "message": "success"
+    }
+
+@router.get("/debug/coalescing")
+async def get_coalescing_stats():
+    """获取请求合并统计（执行次数、共享次数、降载次数、当前排队数）"""
+    return {
+        "code": 200,
+        "message": "success",
+        "data": dashboard_flight.stats()
+    }
+
+@router.get("/debug/compression")
+async def get_compression_stats():
+    """获取响应压缩缓存统计（命中次数、各编码实际压缩次数、可用编码）"""
+    return {
+        "code": 200,
+        "message": "success",
+        "data": payload_cache.stats()
+    }
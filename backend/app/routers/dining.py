@@ -1,32 +1,84 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Query, Request
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 from sqlalchemy import func, desc
 from datetime import datetime, timedelta, time
-from ..models.database import get_db
+from typing import List, Optional
+from pydantic import BaseModel
+from ..models.database import get_db, get_read_db, ReadSessionLocal
 from ..models.canteen import DiningRecord
+from ..utils.compression import compute_payload, payload_response
 from ..utils.dining_simulator import DiningSimulator
+from ..utils.dining_writer import save_dining_records, record_exits
+from ..utils.employee_cache import employee_cache
+from ..utils.occupancy import occupancy_cache
+from ..utils.single_flight import run_coalesced, with_read_session
+from ..utils.streaming import scan_dining_records, iter_keyset_chunks
 import random
 import json
+import os
+import csv
+import io
+import zlib
+from dotenv import load_dotenv
 
 router = APIRouter()
 
+# 加载环境变量
+load_dotenv()
+
+# 是否在 /dining/realtime 中随机生成模拟记录（回放压测时应关闭）
+SIMULATE_DINING = os.getenv("SIMULATE_DINING", "true").lower() in ("1", "true", "yes")
+
 # 创建模拟器实例
 simulator = DiningSimulator()
 
+# 导出就餐记录的列
+EXPORT_COLUMNS = [
+    DiningRecord.id,
+    DiningRecord.employee_id,
+    DiningRecord.payment_time,
+    DiningRecord.exit_time,
+    DiningRecord.payment_amount,
+    DiningRecord.dishes
+]
+
+class DishItem(BaseModel):
+    name: str
+    price: float
+
+class DiningRecordIn(BaseModel):
+    employee_id: str
+    employee_name: Optional[str] = None
+    avatar_url: Optional[str] = None
+    payment_time: Optional[datetime] = None
+    exit_time: Optional[datetime] = None
+    payment_amount: float
+    dishes: List[DishItem]
+
+class DiningRecordBatch(BaseModel):
+    records: List[DiningRecordIn]
+
+class ExitEventIn(BaseModel):
+    employee_id: str
+    exit_time: Optional[datetime] = None
+
+class ExitEventBatch(BaseModel):
+    events: List[ExitEventIn]
+
 @router.get("/dining/trend")
-async def get_dining_trend(db: Session = Depends(get_db)):
-    """获取就餐实时趋势数据"""
+async def get_dining_trend(request: Request):
+    """获取就餐实时趋势数据（并发的相同请求合并为一次查询，压缩结果按数据版本缓存）"""
+    payload = await run_coalesced(("dining_trend",), compute_payload, with_read_session, _compute_dining_trend)
+    return payload_response(request, payload)
+
+def _compute_dining_trend(db: Session):
+    """计算就餐实时趋势数据"""
     try:
         # 获取当前时间和2小时前的时间
         now = datetime.now()
         two_hours_ago = now - timedelta(hours=2)
         
-        # 获取最近2小时的就餐记录
-        records = db.query(DiningRecord).filter(
-            DiningRecord.payment_time >= two_hours_ago,
-            DiningRecord.payment_time <= now
-        ).order_by(DiningRecord.payment_time).all()
-        
         # 生成时间点（每5分钟一个点）
         time_points = []
         current_time = two_hours_ago
@@ -34,16 +86,8 @@ async def get_dining_trend(db: Session = Depends(get_db)):
             time_points.append(current_time)
             current_time += timedelta(minutes=5)
         
-        # 计算每个时间点的在餐人数
-        dining_counts = []
-        for point in time_points:
-            # 计算在这个时间点还在就餐的人数（假设每人就餐时间为20分钟）
-            count = sum(
-                1 for record in records
-                if record.payment_time <= point and 
-                record.payment_time + timedelta(minutes=20) >= point
-            )
-            dining_counts.append(count)
+        # 计算每个时间点的在餐人数（有出闸数据时按实际离场时间，否则按固定就餐时长）
+        dining_counts = [occupancy_cache.count_at(db, point) for point in time_points]
         
         # 格式化时间点（只显示时:分）
         formatted_times = [t.strftime('%H:%M') for t in time_points]
@@ -64,20 +108,75 @@ async def get_dining_trend(db: Session = Depends(get_db)):
             "message": str(e)
         }
 
+@router.get("/dining/occupancy")
+async def get_occupancy(at: Optional[datetime] = None, db: Session = Depends(get_read_db)):
+    """查询任意时刻的在场人数"""
+    try:
+        point = at or datetime.now()
+        return {
+            "code": 200,
+            "message": "success",
+            "data": {
+                "time": point.strftime("%Y-%m-%d %H:%M:%S"),
+                "count": occupancy_cache.count_at(db, point)
+            }
+        }
+    except Exception as e:
+        print(f"查询在场人数出错: {str(e)}")
+        return {
+            "code": 500,
+            "message": str(e)
+        }
+
+@router.get("/dining/occupancy/peak")
+async def get_occupancy_peak(
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    db: Session = Depends(get_read_db)
+):
+    """查询时间段内的在场人数峰值（默认今天）"""
+    try:
+        today = datetime.now().date()
+        start = start or datetime.combine(today, datetime.min.time())
+        end = end or datetime.combine(today, datetime.max.time())
+        if start > end:
+            return {
+                "code": 400,
+                "message": "开始时间不能晚于结束时间"
+            }
+        
+        peak_time, peak_count = occupancy_cache.peak(db, start, end)
+        
+        return {
+            "code": 200,
+            "message": "success",
+            "data": {
+                "start": start.strftime("%Y-%m-%d %H:%M:%S"),
+                "end": end.strftime("%Y-%m-%d %H:%M:%S"),
+                "peak_time": peak_time.strftime("%Y-%m-%d %H:%M:%S"),
+                "peak_count": peak_count
+            }
+        }
+    except Exception as e:
+        print(f"查询在场人数峰值出错: {str(e)}")
+        return {
+            "code": 500,
+            "message": str(e)
+        }
+
 @router.get("/dining/revenue")
-async def get_revenue_trend(db: Session = Depends(get_db)):
-    """获取营业额趋势数据"""
+async def get_revenue_trend(request: Request):
+    """获取营业额趋势数据（并发的相同请求合并为一次查询，压缩结果按数据版本缓存）"""
+    payload = await run_coalesced(("dining_revenue",), compute_payload, with_read_session, _compute_revenue_trend)
+    return payload_response(request, payload)
+
+def _compute_revenue_trend(db: Session):
+    """计算营业额趋势数据"""
     try:
         # 获取当前时间和2小时前的时间
         now = datetime.now()
         two_hours_ago = now - timedelta(hours=2)
         
-        # 获取最近2小时的就餐记录
-        records = db.query(DiningRecord).filter(
-            DiningRecord.payment_time >= two_hours_ago,
-            DiningRecord.payment_time <= now
-        ).order_by(DiningRecord.payment_time).all()
-        
         # 生成时间点（每5分钟一个点）
         time_points = []
         current_time = two_hours_ago
@@ -85,24 +184,26 @@ async def get_revenue_trend(db: Session = Depends(get_db)):
             time_points.append(current_time)
             current_time += timedelta(minutes=5)
         
-        # 计算每个时间点的营业额
-        revenue_data = []
-        for point in time_points:
-            # 计算5分钟时间段内的营业额
-            point_end = point + timedelta(minutes=5)
-            revenue = sum(
-                float(record.payment_amount)
-                for record in records
-                if point <= record.payment_time < point_end
-            )
-            revenue_data.append(round(revenue, 2))
+        # 流式读取最近2小时的支付时间和金额，直接累加到所在的5分钟时间段
+        records = scan_dining_records(
+            db,
+            [DiningRecord.payment_time, DiningRecord.payment_amount],
+            start=two_hours_ago,
+            criteria=[DiningRecord.payment_time <= now]
+        )
+        revenues = [0.0] * len(time_points)
+        total_revenue = 0.0
+        for record in records:
+            amount = float(record.payment_amount or 0)
+            index = int((record.payment_time - two_hours_ago).total_seconds() // 300)
+            if 0 <= index < len(revenues):
+                revenues[index] += amount
+            total_revenue += amount
+        revenue_data = [round(revenue, 2) for revenue in revenues]
         
         # 格式化时间点
         formatted_times = [t.strftime('%H:%M') for t in time_points]
         
-        # 计算当前总营业额
-        total_revenue = sum(float(record.payment_amount) for record in records)
-        
         return {
             "code": 200,
             "message": "success",
@@ -119,12 +220,81 @@ async def get_revenue_trend(db: Session = Depends(get_db)):
             "message": str(e)
         }
 
+@router.post("/dining/records")
+async def create_dining_records(batch: DiningRecordBatch, db: Session = Depends(get_db)):
+    """写入就餐记录（POS 推送、回放工具等）"""
+    try:
+        ids = save_dining_records(db, [
+            {
+                "employee_id": item.employee_id,
+                "employee_name": item.employee_name,
+                "avatar_url": item.avatar_url,
+                "payment_time": item.payment_time,
+                "exit_time": item.exit_time,
+                "payment_amount": item.payment_amount,
+                "dishes": [{"name": dish.name, "price": dish.price} for dish in item.dishes]
+            }
+            for item in batch.records
+        ])
+        
+        return {
+            "code": 200,
+            "message": "success",
+            "data": {
+                "count": len(ids),
+                "ids": ids
+            }
+        }
+    except Exception as e:
+        db.rollback()
+        print(f"写入就餐记录出错: {str(e)}")
+        return {
+            "code": 500,
+            "message": str(e)
+        }
+
+@router.post("/dining/exits")
+async def create_exit_events(batch: ExitEventBatch, db: Session = Depends(get_db)):
+    """写入出闸事件，关联到员工最近一条尚未出闸的就餐记录"""
+    try:
+        matched, unmatched = record_exits(db, [
+            {"employee_id": item.employee_id, "exit_time": item.exit_time}
+            for item in batch.events
+        ])
+        
+        return {
+            "code": 200,
+            "message": "success",
+            "data": {
+                "count": len(matched),
+                "ids": matched,
+                "unmatched": [
+                    {
+                        "employee_id": event["employee_id"],
+                        "exit_time": event["exit_time"].strftime("%Y-%m-%d %H:%M:%S")
+                    }
+                    for event in unmatched
+                ]
+            }
+        }
+    except Exception as e:
+        db.rollback()
+        print(f"写入出闸事件出错: {str(e)}")
+        return {
+            "code": 500,
+            "message": str(e)
+        }
+
 @router.get("/dining/realtime")
-async def get_dining_records(db: Session = Depends(get_db)):
-    """获取实时就餐记录和今日就餐总人数"""
+async def get_dining_records(request: Request, db: Session = Depends(get_db)):
+    """获取实时就餐记录和今日就餐总人数（压缩结果按数据版本缓存）"""
+    return payload_response(request, _query_dining_records(db))
+
+def _query_dining_records(db: Session):
+    """查询实时就餐记录和今日就餐总人数"""
     try:
         # 随机生成新记录（30%的概率）
-        if random.random() < 0.3:
+        if SIMULATE_DINING and random.random() < 0.3:
             simulator.add_random_records(db, random.randint(1, 3))
         
         # 获取今天的开始时间和结束时间
@@ -142,6 +312,9 @@ async def get_dining_records(db: Session = Depends(get_db)):
             DiningRecord.payment_time.desc()
         ).limit(10).all()
         
+        # 员工姓名从员工信息缓存中读取
+        profiles = employee_cache.get_many(db, (record.employee_id for record in records))
+        
         # 转换记录为字典格式
         records_data = []
         for record in records:
@@ -150,7 +323,7 @@ async def get_dining_records(db: Session = Depends(get_db)):
                 records_data.append({
                     "id": record.id,
                     "employee_id": record.employee_id,
-                    "employee_name": record.employee_name,
+                    "employee_name": profiles.get(record.employee_id, {}).get("employee_name"),
                     "payment_time": record.payment_time.strftime("%Y-%m-%d %H:%M:%S"),
                     "payment_amount": float(record.payment_amount),
                     "dishes": dishes
@@ -177,4 +350,90 @@ async def get_dining_records(db: Session = Depends(get_db)):
                 "records": []
             }
         }
-  
\ No newline at end of file
+  
+
+def _export_row(record, profiles):
+    """将导出的一行转换为可序列化的字典"""
+    dishes = json.loads(record.dishes) if isinstance(record.dishes, str) else record.dishes
+    return {
+        "id": record.id,
+        "employee_id": record.employee_id,
+        "employee_name": profiles.get(record.employee_id, {}).get("employee_name"),
+        "payment_time": record.payment_time.strftime("%Y-%m-%d %H:%M:%S") if record.payment_time else None,
+        "exit_time": record.exit_time.strftime("%Y-%m-%d %H:%M:%S") if record.exit_time else None,
+        "payment_amount": float(record.payment_amount) if record.payment_amount is not None else None,
+        "dishes": dishes
+    }
+
+def _iter_export(start: datetime, end: datetime, export_format: str, compress: bool):
+    """逐块生成导出内容，每块查询后立即输出，内存占用与导出总量无关"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None
+    
+    def emit(text):
+        data = text.encode("utf-8")
+        if compressor is None:
+            return data
+        # 同步刷新，使已压缩的数据立即发送给客户端
+        return compressor.compress(data) + compressor.flush(zlib.Z_SYNC_FLUSH)
+    
+    # 导出在响应流中进行，单独创建会话，避免请求依赖提前关闭会话
+    db = ReadSessionLocal()
+    try:
+        if export_format == "csv":
+            # 带 BOM 便于 Excel 正确识别 UTF-8
+            yield emit("\ufeffid,employee_id,employee_name,payment_time,exit_time,payment_amount,dishes\r\n")
+        
+        for chunk in iter_keyset_chunks(db, EXPORT_COLUMNS, start, end):
+            profiles = employee_cache.get_many(db, (record.employee_id for record in chunk))
+            buffer = io.StringIO()
+            if export_format == "csv":
+                writer = csv.writer(buffer)
+                for record in chunk:
+                    row = _export_row(record, profiles)
+                    row["dishes"] = json.dumps(row["dishes"], ensure_ascii=False)
+                    writer.writerow(row.values())
+            else:
+                for record in chunk:
+                    buffer.write(json.dumps(_export_row(record, profiles), ensure_ascii=False))
+                    buffer.write("\n")
+            yield emit(buffer.getvalue())
+        
+        if compressor is not None:
+            yield compressor.flush()
+    except Exception as e:
+        # 响应头已发送，只能中断分块传输，让客户端看到不完整的下载而不是缺行的文件
+        print(f"导出就餐记录出错，已中断导出: {str(e)}")
+        raise
+    finally:
+        db.close()
+
+@router.get("/dining/export")
+async def export_dining_records(
+    start: datetime,
+    end: datetime,
+    export_format: str = Query("csv", alias="format"),
+    compress: bool = Query(False, alias="gzip")
+):
+    """按时间段流式导出就餐记录（CSV 或 NDJSON，可选 gzip 压缩）"""
+    if export_format not in ("csv", "ndjson"):
+        return {
+            "code": 400,
+            "message": "导出格式只支持 csv 或 ndjson"
+        }
+    if start >= end:
+        return {
+            "code": 400,
+            "message": "开始时间必须早于结束时间"
+        }
+    
+    filename = f"dining_records_{start.strftime('%Y%m%d')}_{end.strftime('%Y%m%d')}.{export_format}"
+    media_type = "text/csv; charset=utf-8" if export_format == "csv" else "application/x-ndjson"
+    if compress:
+        filename += ".gz"
+        media_type = "application/gzip"
+    
+    return StreamingResponse(
+        _iter_export(start, end, export_format, compress),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
@@ -3,19 +3,27 @@ import os
 from decimal import Decimal
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
 
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Request
 from sqlalchemy.orm import Session
 from sqlalchemy import func, desc
 from datetime import datetime, timedelta
-from ..models.database import get_db
 from ..models.canteen import DiningRecord
-import json
+from ..utils.compression import compute_payload, payload_response
+from ..utils.single_flight import run_coalesced, with_read_session
+from ..utils.streaming import scan_dining_records, iter_dishes
 
 router = APIRouter()
 
 @router.get("/dish/analysis")
-async def get_dish_analysis(db: Session = Depends(get_db)):
-    """获取实时菜品销售分析"""
+async def get_dish_analysis(request: Request):
+    """获取实时菜品销售分析（并发的相同请求合并为一次查询，压缩结果按数据版本缓存）"""
+    payload = await run_coalesced(
+        ("dish_analysis",), compute_payload, with_read_session, _compute_dish_analysis
+    )
+    return payload_response(request, payload)
+
+def _compute_dish_analysis(db: Session):
+    """计算实时菜品销售分析"""
     try:
         print("开始获取菜品分析数据...")
         
@@ -23,39 +31,26 @@ async def get_dish_analysis(db: Session = Depends(get_db)):
         today = datetime.now().date()
         today_start = datetime.combine(today, datetime.min.time())
         
-        # 获取所有今日就餐记录
-        records = db.query(DiningRecord).filter(
-            DiningRecord.payment_time >= today_start
-        ).all()
-        
-        print(f"查询到 {len(records)} 条就餐记录")
+        # 流式读取今日就餐记录的菜品字段，逐条聚合，不整天加载到内存
+        records = scan_dining_records(db, [DiningRecord.dishes], start=today_start)
         
         # 统计菜品销量
         dish_stats = {}
         total_sales = 0
         
-        for record in records:
-            if record.dishes:
-                try:
-                    dishes = json.loads(record.dishes) if isinstance(record.dishes, str) else record.dishes
-                    print(f"处理就餐记录: {dishes}")
-                    for dish in dishes:
-                        dish_name = dish.get('name', '')
-                        if dish_name:
-                            if dish_name not in dish_stats:
-                                dish_stats[dish_name] = {
-                                    'name': dish_name,
-                                    'sales': 0,
-                                    'revenue': 0.0
-                                }
-                            dish_stats[dish_name]['sales'] += 1
-                            dish_stats[dish_name]['revenue'] += float(dish.get('price', 0))
-                            total_sales += 1
-                except Exception as e:
-                    print(f"处理菜品数据出错: {e}")
-                    continue
+        for dish in iter_dishes(records):
+            dish_name = dish['name']
+            if dish_name not in dish_stats:
+                dish_stats[dish_name] = {
+                    'name': dish_name,
+                    'sales': 0,
+                    'revenue': 0.0
+                }
+            dish_stats[dish_name]['sales'] += 1
+            dish_stats[dish_name]['revenue'] += float(dish.get('price', 0))
+            total_sales += 1
         
-        print(f"统计得到 {len(dish_stats)} 种菜品")
+        print(f"统计得到 {len(dish_stats)} 种菜品，共 {total_sales} 份")
         
         # 转换为列表并排序
         dish_list = list(dish_stats.values())
@@ -0,0 +1,116 @@
+from fastapi import APIRouter, Depends
+from sqlalchemy.orm import Session
+from datetime import datetime
+from typing import Optional
+from ..models.database import get_read_db
+from ..models.canteen import DiningRecord
+from ..utils.employee_cache import employee_cache
+from ..utils.employee_rollup import employee_summary, top_spenders, month_start
+
+router = APIRouter()
+
+def _resolve_range(start: Optional[datetime], end: Optional[datetime]):
+    """默认统计本月初至今，返回 (开始时间, 结束时间, 是否统计截至当前)"""
+    now = datetime.now()
+    open_ended = end is None or end >= now
+    end = end or now
+    start = start or datetime.combine(month_start(now), datetime.min.time())
+    return start, end, open_ended
+
+@router.get("/employees/top-spenders")
+async def get_top_spenders(
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    limit: int = 10,
+    db: Session = Depends(get_read_db)
+):
+    """获取时间段内消费最多的员工（默认本月）"""
+    try:
+        start, end, open_ended = _resolve_range(start, end)
+        if start >= end:
+            return {
+                "code": 400,
+                "message": "开始时间必须早于结束时间"
+            }
+
+        ranked = top_spenders(db, start, end, limit, open_ended)
+
+        return {
+            "code": 200,
+            "message": "success",
+            "data": {
+                "start": start.strftime("%Y-%m-%d %H:%M:%S"),
+                "end": end.strftime("%Y-%m-%d %H:%M:%S"),
+                "employees": [
+                    {
+                        "rank": i + 1,
+                        "employee_id": item["employee_id"],
+                        "total_spend": round(float(item["spend"]), 2),
+                        "visit_count": item["visits"]
+                    }
+                    for i, item in enumerate(ranked)
+                ]
+            }
+        }
+    except Exception as e:
+        print(f"获取员工消费排行出错: {str(e)}")
+        return {
+            "code": 500,
+            "message": str(e)
+        }
+
+@router.get("/employees/{employee_id}/summary")
+async def get_employee_summary(
+    employee_id: str,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    db: Session = Depends(get_read_db)
+):
+    """获取员工在时间段内的就餐次数、消费和常点菜品（默认本月）"""
+    try:
+        start, end, open_ended = _resolve_range(start, end)
+        if start >= end:
+            return {
+                "code": 400,
+                "message": "开始时间必须早于结束时间"
+            }
+
+        summary = employee_summary(db, employee_id, start, end, open_ended)
+        visits = summary["visits"]
+        spend = float(summary["spend"])
+        days = max((end - start).total_seconds() / 86400, 1)
+
+        # 最近一次就餐记录（走 (employee_id, payment_time) 索引）
+        last_record = db.query(
+            DiningRecord.payment_time
+        ).filter(
+            DiningRecord.employee_id == employee_id
+        ).order_by(DiningRecord.payment_time.desc()).first()
+
+        profile = employee_cache.get_many(db, [employee_id]).get(employee_id, {})
+
+        return {
+            "code": 200,
+            "message": "success",
+            "data": {
+                "employee_id": employee_id,
+                "employee_name": profile.get("employee_name"),
+                "start": start.strftime("%Y-%m-%d %H:%M:%S"),
+                "end": end.strftime("%Y-%m-%d %H:%M:%S"),
+                "visit_count": visits,
+                "visits_per_week": round(visits * 7 / days, 2),
+                "total_spend": round(spend, 2),
+                "avg_spend": round(spend / visits, 2) if visits > 0 else 0,
+                "favourite_dishes": [
+                    {"name": name, "count": count}
+                    for name, count in summary["dishes"].most_common(5)
+                ],
+                "last_visit": last_record.payment_time.strftime("%Y-%m-%d %H:%M:%S") if last_record else None
+            }
+        }
+    except Exception as e:
+        print(f"获取员工就餐汇总出错: {str(e)}")
+        return {
+            "code": 500,
+            "message": str(e)
+        }
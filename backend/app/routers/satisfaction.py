@@ -1,10 +1,13 @@
 from fastapi import APIRouter, Depends
+from starlette.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from sqlalchemy import func
-from ..models.database import get_db
+from ..models.database import get_read_db
 from ..models.canteen import Satisfaction
-from typing import List
+from typing import List, Optional
 from pydantic import BaseModel
+from datetime import datetime, timedelta
+from ..utils.comment_index import comment_index
 
 router = APIRouter()
 
@@ -14,7 +17,7 @@ class SatisfactionStats(BaseModel):
     percentage: float
 
 @router.get("/satisfaction/stats")
-async def get_satisfaction_stats(db: Session = Depends(get_db)):
+async def get_satisfaction_stats(db: Session = Depends(get_read_db)):
     """获取满意度评价统计"""
     try:
         # 查询各评分的数量
@@ -40,6 +43,7 @@ async def get_satisfaction_stats(db: Session = Depends(get_db)):
         
         return {
             "code": 200,
+            "message": "success",
             "data": {
                 "total": total,
                 "stats": stats
@@ -49,4 +53,73 @@ async def get_satisfaction_stats(db: Session = Depends(get_db)):
         return {
             "code": 500,
             "message": f"获取满意度统计失败: {str(e)}"
-        } 
\ No newline at end of file
+        }
+
+@router.get("/satisfaction/search")
+async def search_satisfaction(
+    q: str,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    max_rating: Optional[int] = None,
+    limit: int = 20,
+    db: Session = Depends(get_read_db)
+):
+    """按关键词搜索评价内容（倒排索引，不扫描全表）"""
+    try:
+        # 刷新需要查询数据库，放到线程池中执行，不阻塞事件循环
+        if not await run_in_threadpool(comment_index.refresh, db):
+            return {
+                "code": 503,
+                "message": "评价索引构建中，请稍后重试"
+            }
+        total, matches = await run_in_threadpool(comment_index.search, q, start, end, max_rating, limit)
+        
+        return {
+            "code": 200,
+            "message": "success",
+            "data": {
+                "total": total,
+                "results": matches
+            }
+        }
+    except Exception as e:
+        return {
+            "code": 500,
+            "message": f"搜索评价失败: {str(e)}"
+        }
+
+@router.get("/satisfaction/keywords")
+async def get_complaint_keywords(
+    days: int = 7,
+    end: Optional[datetime] = None,
+    limit: int = 10,
+    db: Session = Depends(get_read_db)
+):
+    """获取时间窗口内投诉评价的高频关键词（默认最近7天）"""
+    try:
+        if not await run_in_threadpool(comment_index.refresh, db):
+            return {
+                "code": 503,
+                "message": "评价索引构建中，请稍后重试"
+            }
+        end_date = (end or datetime.now()).date()
+        start_date = end_date - timedelta(days=max(days, 1) - 1)
+        keywords = await run_in_threadpool(comment_index.top_keywords, start_date, end_date, limit)
+        
+        return {
+            "code": 200,
+            "message": "success",
+            "data": {
+                "start": start_date.strftime("%Y-%m-%d"),
+                "end": end_date.strftime("%Y-%m-%d"),
+                "keywords": [
+                    {"keyword": keyword, "count": count}
+                    for keyword, count in keywords
+                ]
+            }
+        }
+    except Exception as e:
+        return {
+            "code": 500,
+            "message": f"获取投诉关键词失败: {str(e)}"
+        }
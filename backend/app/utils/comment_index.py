@@ -0,0 +1,241 @@
+import os
+import re
+import threading
+from bisect import insort
+from collections import Counter
+from datetime import date, datetime, timedelta
+from typing import List, Optional
+from dotenv import load_dotenv
+from sqlalchemy.orm import Session
+from ..models.canteen import Satisfaction
+from ..models.database import ReadSessionLocal
+from .streaming import stream_query
+
+# 加载环境变量
+load_dotenv()
+
+# 评分不高于该值的评价视为投诉
+COMPLAINT_MAX_RATING = int(os.getenv("COMPLAINT_MAX_RATING", "3"))
+
+# 增量更新时回看的 ID 数量，用于补上晚于更大 ID 提交的评价
+REFRESH_OVERLAP = 100
+
+# 中日韩文字连续片段 / 英文数字单词
+CJK_PATTERN = re.compile(r"[㐀-䶿一-鿿豈-﫿぀-ヿ가-힯]+")
+WORD_PATTERN = re.compile(r"[a-z0-9]+")
+
+# 关键词统计时作为词边界的虚词、代词、语气词，含这些字的片段不会成为关键词
+KEYWORD_STOP_PATTERN = re.compile("[的了是在很太也都就还又和与及而但吗呢吧啊呀哦嘛我你他她它们这那个些有被把给让得地着过]")
+
+# 关键词最长字数
+KEYWORD_MAX_LENGTH = 6
+
+# 短词的出现次数不超过包含它的长词的该倍数时，视为长词的片段，不单独列出
+KEYWORD_MERGE_RATIO = 1.25
+
+
+def tokenize(text: str) -> List[str]:
+    """分词：中日韩文字切成二元组（单字片段保留单字），英文数字按单词切分"""
+    if not text:
+        return []
+    text = text.lower()
+    terms = []
+    for run in CJK_PATTERN.findall(text):
+        if len(run) == 1:
+            terms.append(run)
+        else:
+            terms.extend(run[i:i + 2] for i in range(len(run) - 1))
+    terms.extend(WORD_PATTERN.findall(text))
+    return terms
+
+
+def keyword_terms(text: str) -> set:
+    """提取关键词候选：在虚词处切开中日韩文字片段，取其中 2 至 KEYWORD_MAX_LENGTH 字的
+    所有连续子串，英文数字取两个字符以上的单词"""
+    if not text:
+        return set()
+    text = text.lower()
+    terms = set()
+    for run in CJK_PATTERN.findall(text):
+        for segment in KEYWORD_STOP_PATTERN.split(run):
+            for size in range(2, min(len(segment), KEYWORD_MAX_LENGTH) + 1):
+                terms.update(segment[i:i + size] for i in range(len(segment) - size + 1))
+    terms.update(word for word in WORD_PATTERN.findall(text) if len(word) > 1)
+    return terms
+
+
+def merge_keywords(counts: Counter) -> Counter:
+    """去掉只作为长词片段出现的词项，例如 "等待时间" 中的 "待时"、"等待时"
+
+    逐个检查长词的子串，子串次数不超过长词次数的 KEYWORD_MERGE_RATIO 倍时去掉子串；
+    "等待" 若还单独出现在其它评价中（次数明显更多），则保留。
+    """
+    absorbed = set()
+    for term, count in counts.items():
+        for size in range(2, len(term)):
+            for i in range(len(term) - size + 1):
+                part = term[i:i + size]
+                if part in counts and counts[part] <= count * KEYWORD_MERGE_RATIO:
+                    absorbed.add(part)
+    return Counter({term: count for term, count in counts.items() if term not in absorbed})
+
+
+class CommentIndex:
+    """满意度评价内容的倒排索引
+
+    每个词项对应按 ID 升序排列的评价列表；查询时对各词项的倒排表求交集，
+    再用原文校验短语是否连续出现。另按天累计投诉评价中各词项的出现次数，
+    关键词统计只需合并时间窗口内每天的计数。
+
+    索引在启动时由后台线程从数据库构建（warm_up），构建完成前查询接口直接返回
+    “索引构建中”；之后每次查询前只拉取新增的评价。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.postings = {}          # 词项 -> [评价ID]
+        self.docs = {}              # 评价ID -> (评价时间, 评分, 内容)
+        self.day_terms = {}         # 日期 -> Counter(词项 -> 投诉评价数)
+        self.last_id = 0
+        self.ready = False          # 初始索引是否已构建完成
+        self._building = False
+
+    def add(self, satisfaction_id: int, rating: int, comment: Optional[str], created_at: datetime):
+        """将一条评价加入索引"""
+        if satisfaction_id in self.docs:
+            return
+        self.docs[satisfaction_id] = (created_at, rating, comment or "")
+        self.last_id = max(self.last_id, satisfaction_id)
+
+        terms = set(tokenize(comment))
+        # 额外索引单字，使单字查询也能命中多字片段中的字
+        index_terms = terms | set(
+            char for run in CJK_PATTERN.findall((comment or "").lower()) for char in run
+        )
+        for term in index_terms:
+            postings = self.postings.setdefault(term, [])
+            if not postings or postings[-1] < satisfaction_id:
+                postings.append(satisfaction_id)
+            else:
+                insort(postings, satisfaction_id)
+
+        # 关键词统计使用在虚词处切开的 2-6 字片段，排名时再合并为最长的词
+        keywords = keyword_terms(comment)
+        if keywords and created_at is not None and rating is not None and rating <= COMPLAINT_MAX_RATING:
+            self.day_terms.setdefault(created_at.date(), Counter()).update(keywords)
+
+    def _new_rows(self, db: Session, after_id: int):
+        """流式读取 ID 大于 after_id - REFRESH_OVERLAP 的评价"""
+        query = db.query(
+            Satisfaction.id,
+            Satisfaction.rating,
+            Satisfaction.comment,
+            Satisfaction.created_at
+        ).filter(
+            Satisfaction.id > after_id - REFRESH_OVERLAP
+        ).order_by(Satisfaction.id)
+        return stream_query(query)
+
+    def refresh(self, db: Session) -> bool:
+        """拉取上次索引之后新增的评价；索引尚未构建完成时触发后台构建并返回 False"""
+        with self._lock:
+            ready, after_id = self.ready, self.last_id
+        if not ready:
+            self.warm_up()
+            return False
+
+        # 查询在锁外进行，只在加入索引时持有锁
+        rows = list(self._new_rows(db, after_id))
+        with self._lock:
+            for row in rows:
+                self.add(row.id, row.rating, row.comment, row.created_at)
+        return True
+
+    def warm_up(self):
+        """在后台线程中构建索引，避免首次查询时在请求中扫描整张评价表
+
+        构建写入一个新的索引对象，完成后在锁内整体替换，构建期间不占用锁。
+        """
+        with self._lock:
+            if self.ready or self._building:
+                return
+            self._building = True
+
+        def build():
+            fresh = CommentIndex()
+            db = ReadSessionLocal()
+            try:
+                for row in fresh._new_rows(db, 0):
+                    fresh.add(row.id, row.rating, row.comment, row.created_at)
+                with self._lock:
+                    self.postings = fresh.postings
+                    self.docs = fresh.docs
+                    self.day_terms = fresh.day_terms
+                    self.last_id = fresh.last_id
+                    self.ready = True
+                print(f"评价索引构建完成，共 {len(fresh.docs)} 条评价")
+            except Exception as e:
+                print(f"构建评价索引出错: {e}")
+            finally:
+                db.close()
+                with self._lock:
+                    self._building = False
+
+        threading.Thread(target=build, name="comment-index", daemon=True).start()
+
+    def search(self, keyword: str, start: Optional[datetime] = None, end: Optional[datetime] = None,
+               max_rating: Optional[int] = None, limit: int = 20):
+        """搜索包含关键词的评价，按 ID 倒序（最新写入在前）返回 (总数, 评价列表)"""
+        phrases = [phrase for phrase in keyword.lower().split() if phrase]
+        terms = set(term for phrase in phrases for term in tokenize(phrase))
+        if not terms:
+            return 0, []
+
+        with self._lock:
+            # 从最短的倒排表开始求交集
+            lists = sorted((self.postings.get(term, []) for term in terms), key=len)
+            candidates = set(lists[0])
+            for postings in lists[1:]:
+                if not candidates:
+                    break
+                candidates.intersection_update(postings)
+
+            matches = []
+            for satisfaction_id in sorted(candidates, reverse=True):
+                created_at, rating, comment = self.docs[satisfaction_id]
+                if start is not None and (created_at is None or created_at < start):
+                    continue
+                if end is not None and (created_at is None or created_at >= end):
+                    continue
+                if max_rating is not None and (rating is None or rating > max_rating):
+                    continue
+                # 二元组命中不代表短语连续出现，用原文校验
+                lowered = comment.lower()
+                if all(phrase in lowered for phrase in phrases):
+                    matches.append({
+                        "id": satisfaction_id,
+                        "rating": rating,
+                        "comment": comment,
+                        "created_at": created_at.strftime("%Y-%m-%d %H:%M:%S") if created_at else None
+                    })
+
+        return len(matches), matches[:limit]
+
+    def top_keywords(self, start_date: date, end_date: date, limit: int = 10):
+        """统计 [start_date, end_date] 内投诉评价中出现最多的词项"""
+        totals = Counter()
+        with self._lock:
+            if (end_date - start_date).days + 1 <= len(self.day_terms):
+                day = start_date
+                while day <= end_date:
+                    totals.update(self.day_terms.get(day, {}))
+                    day += timedelta(days=1)
+            else:
+                for day, counts in self.day_terms.items():
+                    if start_date <= day <= end_date:
+                        totals.update(counts)
+        return merge_keywords(totals).most_common(limit)
+
+
+# 全局评价索引
+comment_index = CommentIndex()
@@ -0,0 +1,173 @@
+import gzip
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from dotenv import load_dotenv
+from fastapi.encoders import jsonable_encoder
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response
+
+# brotli / zstandard 为可选依赖，未安装时只使用 gzip
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# 加载环境变量
+load_dotenv()
+
+# 响应体不小于该字节数时才压缩
+COMPRESS_MIN_SIZE = int(os.getenv("COMPRESS_MIN_SIZE", "1024"))
+
+# 缓存的不同数据版本数量上限
+COMPRESS_CACHE_SIZE = int(os.getenv("COMPRESS_CACHE_SIZE", "64"))
+
+# 各编码的压缩函数；每个数据版本只压缩一次，可以使用较高的压缩级别
+ENCODERS = {"gzip": lambda body: gzip.compress(body, compresslevel=6, mtime=0)}
+if brotli is not None:
+    ENCODERS["br"] = lambda body: brotli.compress(body, quality=6)
+if zstandard is not None:
+    ENCODERS["zstd"] = lambda body: zstandard.ZstdCompressor(level=10).compress(body)
+
+# 客户端权重相同时优先选择的编码
+ENCODING_PREFERENCE = [name for name in ("br", "zstd", "gzip") if name in ENCODERS]
+
+
+def negotiate(accept_encoding: str) -> str:
+    """根据 Accept-Encoding 选择编码，没有可用编码时返回 identity"""
+    weights = {}
+    for item in accept_encoding.split(","):
+        name, _, params = item.strip().partition(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        weight = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                weight = float(params[2:])
+            except ValueError:
+                weight = 0.0
+        weights[name] = weight
+
+    best, best_weight = "identity", 0.0
+    for name in ENCODING_PREFERENCE:
+        weight = weights.get(name, weights.get("*", 0.0))
+        if weight > best_weight:
+            best, best_weight = name, weight
+    return best
+
+
+class Payload:
+    """序列化后的响应数据及其各编码的压缩结果
+
+    version 为响应体的摘要，内容相同的数据共享同一个 Payload，
+    每种编码在第一次被请求时压缩一次，之后直接返回缓存的字节。
+    """
+
+    def __init__(self, version: str, body: bytes):
+        self.version = version
+        self.body = body
+        self._encoded = {}
+        self._lock = threading.Lock()
+
+    def encode(self, encoding: str) -> bytes:
+        """返回指定编码的响应体"""
+        if encoding == "identity":
+            return self.body
+        encoded = self._encoded.get(encoding)
+        if encoded is None:
+            with self._lock:
+                encoded = self._encoded.get(encoding)
+                if encoded is None:
+                    encoded = self._encoded[encoding] = ENCODERS[encoding](self.body)
+                    payload_cache.record_compression(encoding)
+        return encoded
+
+
+class PayloadCache:
+    """按数据版本缓存 Payload 的 LRU 缓存"""
+
+    def __init__(self, capacity: int = COMPRESS_CACHE_SIZE):
+        self.capacity = capacity
+        self._items = OrderedDict()     # 数据版本 -> Payload
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "compressions": {}}
+
+    def get_or_add(self, version: str, body: bytes) -> Payload:
+        """返回该数据版本的 Payload，不存在时新建，超出容量时淘汰最久未使用的条目"""
+        with self._lock:
+            payload = self._items.get(version)
+            if payload is not None:
+                self._items.move_to_end(version)
+                self._stats["hits"] += 1
+                return payload
+            payload = self._items[version] = Payload(version, body)
+            self._stats["misses"] += 1
+            while len(self._items) > self.capacity:
+                self._items.popitem(last=False)
+            return payload
+
+    def record_compression(self, encoding: str):
+        with self._lock:
+            compressions = self._stats["compressions"]
+            compressions[encoding] = compressions.get(encoding, 0) + 1
+
+    def stats(self):
+        """返回缓存统计"""
+        with self._lock:
+            return {
+                "hits": self._stats["hits"],
+                "misses": self._stats["misses"],
+                "compressions": dict(self._stats["compressions"]),
+                "size": len(self._items),
+                "capacity": self.capacity,
+                "min_size": COMPRESS_MIN_SIZE,
+                "encodings": ENCODING_PREFERENCE
+            }
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+
+# 大屏接口共用的响应缓存
+payload_cache = PayloadCache()
+
+
+def build_payload(data) -> Payload:
+    """将响应数据序列化为 JSON（与 FastAPI 默认输出一致）并取得对应的 Payload"""
+    body = json.dumps(
+        jsonable_encoder(data),
+        ensure_ascii=False,
+        allow_nan=False,
+        indent=None,
+        separators=(",", ":")
+    ).encode("utf-8")
+    return payload_cache.get_or_add(hashlib.sha1(body).hexdigest(), body)
+
+
+def compute_payload(fn, *args) -> Payload:
+    """执行计算并序列化结果，供合并器在线程池中调用，使共享同一结果的请求只序列化一次"""
+    return build_payload(fn(*args))
+
+
+def payload_response(request: Request, payload) -> Response:
+    """按客户端支持的编码返回响应，payload 也可以是未序列化的数据（如降载响应）"""
+    if not isinstance(payload, Payload):
+        payload = build_payload(payload)
+
+    headers = {"Vary": "Accept-Encoding"}
+    encoding = "identity"
+    if len(payload.body) >= COMPRESS_MIN_SIZE:
+        encoding = negotiate(request.headers.get("accept-encoding", ""))
+    if encoding != "identity":
+        headers["Content-Encoding"] = encoding
+    return Response(payload.encode(encoding), media_type=JSONResponse.media_type, headers=headers)
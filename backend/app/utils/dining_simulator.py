@@ -1,8 +1,7 @@
 import random
 from datetime import datetime
-import json
 from sqlalchemy.orm import Session
-from ..models.canteen import DiningRecord
+from .dining_writer import save_dining_records
 
 class DiningSimulator:
     def __init__(self):
@@ -45,22 +44,11 @@ class DiningSimulator:
         }
 
     def add_random_records(self, db: Session, count: int = 1) -> list:
-        """添加随机就餐记录到数据库"""
-        new_records = []
+        """添加随机就餐记录到数据库，返回新记录的ID"""
         try:
-            for _ in range(count):
-                record_data = self.generate_record()
-                record = DiningRecord(
-                    employee_id=record_data["employee_id"],
-                    employee_name=record_data["employee_name"],
-                    payment_time=record_data["payment_time"],
-                    payment_amount=record_data["payment_amount"],
-                    dishes=json.dumps(record_data["dishes"])
-                )
-                db.add(record)
-                new_records.append(record)
-            
-            db.commit()
+            new_records = save_dining_records(
+                db, [self.generate_record() for _ in range(count)]
+            )
             print(f"成功添加 {len(new_records)} 条新就餐记录")
             return new_records
         except Exception as e:
@@ -0,0 +1,96 @@
+import json
+from datetime import datetime
+from sqlalchemy.orm import Session
+from ..models.canteen import DiningRecord
+from .employee_cache import employee_cache, upsert_employees
+from .employee_rollup import apply_records
+from .occupancy import DEFAULT_DWELL, MAX_DWELL, occupancy_cache
+
+
+def save_dining_records(db: Session, records_data: list) -> list:
+    """写入就餐记录，并在同一事务内补齐员工维度表、更新员工月度汇总，返回新记录的ID
+
+    所有就餐记录的写入（模拟器、POS 推送、回放工具）都应经过这里。
+    员工姓名、头像只写入 employees 表，就餐记录只保存员工ID。
+    """
+    records = []
+    profiles = {}
+    for record_data in records_data:
+        # 同一批次中同一员工的多条记录，以提供了值的字段为准
+        profile = profiles.setdefault(
+            record_data["employee_id"], {"employee_name": None, "avatar_url": None}
+        )
+        for key in profile:
+            if record_data.get(key) is not None:
+                profile[key] = record_data[key]
+        record = DiningRecord(
+            employee_id=record_data["employee_id"],
+            payment_time=record_data.get("payment_time") or datetime.now(),
+            exit_time=record_data.get("exit_time"),
+            payment_amount=record_data["payment_amount"],
+            dishes=json.dumps(record_data["dishes"])
+        )
+        db.add(record)
+        records.append(record)
+
+    changed_profiles = upsert_employees(db, profiles)
+    apply_records(db, records)
+    # 提交后实例会过期，ID 和时间在提交前读取，避免每条记录再查询一次
+    db.flush()
+    ids = [record.id for record in records]
+    intervals = _dining_intervals(records)
+    db.commit()
+
+    # 提交成功后再更新缓存，避免缓存中出现未落库的员工
+    for profile in changed_profiles:
+        employee_cache.put(profile)
+    _invalidate_occupancy(intervals)
+    return ids
+
+
+def _dining_intervals(records: list) -> list:
+    """取出就餐记录的 (入场时间, 离场时间)，离场时间缺失时按固定就餐时长估算"""
+    return [
+        (record.payment_time, max(record.exit_time or record.payment_time + DEFAULT_DWELL, record.payment_time))
+        for record in records
+    ]
+
+
+def _invalidate_occupancy(intervals: list):
+    """写入或修改了历史日期的就餐记录时，丢弃对应日期缓存的在场人数索引"""
+    today = datetime.combine(datetime.now().date(), datetime.min.time())
+    for entered_at, left_at in intervals:
+        if entered_at < today:
+            occupancy_cache.invalidate(entered_at, left_at)
+
+
+def record_exits(db: Session, events: list) -> tuple:
+    """写入出闸事件，返回 (已关联的就餐记录ID, 未能关联的事件)
+
+    出闸闸机只上报员工ID和出闸时间，每个事件关联到该员工在出闸前
+    MAX_DWELL 内最近一条尚未出闸的就餐记录（走 (employee_id, payment_time) 索引）。
+    """
+    matched = []
+    unmatched = []
+    for event in events:
+        exit_time = event.get("exit_time") or datetime.now()
+        record = db.query(DiningRecord).filter(
+            DiningRecord.employee_id == event["employee_id"],
+            DiningRecord.payment_time <= exit_time,
+            DiningRecord.payment_time >= exit_time - MAX_DWELL,
+            DiningRecord.exit_time.is_(None)
+        ).order_by(DiningRecord.payment_time.desc()).with_for_update().first()
+
+        if record is None:
+            unmatched.append({"employee_id": event["employee_id"], "exit_time": exit_time})
+            continue
+        record.exit_time = exit_time
+        # 立即刷新，使同一批次中该员工的下一个事件关联到更早的记录
+        db.flush()
+        matched.append(record)
+
+    ids = [record.id for record in matched]
+    intervals = _dining_intervals(matched)
+    db.commit()
+    _invalidate_occupancy(intervals)
+    return ids, unmatched
@@ -0,0 +1,123 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional
+from dotenv import load_dotenv
+from sqlalchemy.orm import Session
+from ..models.canteen import Employee
+from .upsert import upsert_non_null
+
+# 加载环境变量
+load_dotenv()
+
+# 进程内缓存的员工信息条数
+EMPLOYEE_CACHE_SIZE = int(os.getenv("EMPLOYEE_CACHE_SIZE", "5000"))
+
+# 缓存有效期（秒），过期后重新从数据库读取，以便看到其它进程的修改
+EMPLOYEE_CACHE_TTL = float(os.getenv("EMPLOYEE_CACHE_TTL", "300"))
+
+
+def _profile(employee: Employee) -> dict:
+    return {
+        "employee_id": employee.employee_id,
+        "employee_name": employee.employee_name,
+        "avatar_url": employee.avatar_url
+    }
+
+
+class EmployeeProfileCache:
+    """员工信息 LRU 缓存
+
+    渲染实时就餐记录、导出等场景只需按员工ID取姓名和头像，
+    命中缓存时不访问数据库；未命中的员工用一次 IN 查询批量读取。
+    """
+
+    def __init__(self, capacity: int = EMPLOYEE_CACHE_SIZE, ttl: float = EMPLOYEE_CACHE_TTL):
+        self.capacity = capacity
+        self.ttl = ttl
+        self._items = OrderedDict()     # 员工ID -> (写入时刻, 员工信息)
+        self._lock = threading.Lock()
+
+    def peek(self, employee_id: str) -> Optional[dict]:
+        """读取缓存中的员工信息，不存在或已过期时返回 None"""
+        with self._lock:
+            item = self._items.get(employee_id)
+            if item is None:
+                return None
+            cached_at, profile = item
+            if time.monotonic() - cached_at > self.ttl:
+                del self._items[employee_id]
+                return None
+            self._items.move_to_end(employee_id)
+            return profile
+
+    def put(self, profile: dict):
+        """写入一条员工信息，超出容量时淘汰最久未使用的条目"""
+        with self._lock:
+            self._items[profile["employee_id"]] = (time.monotonic(), profile)
+            self._items.move_to_end(profile["employee_id"])
+            while len(self._items) > self.capacity:
+                self._items.popitem(last=False)
+
+    def get_many(self, db: Session, employee_ids: Iterable[str]) -> Dict[str, dict]:
+        """批量获取员工信息，未命中的部分一次性从数据库读取"""
+        profiles = {}
+        missing = []
+        for employee_id in set(employee_ids):
+            if not employee_id:
+                continue
+            profile = self.peek(employee_id)
+            if profile is None:
+                missing.append(employee_id)
+            else:
+                profiles[employee_id] = profile
+
+        if missing:
+            for employee in db.query(Employee).filter(Employee.employee_id.in_(missing)):
+                profile = _profile(employee)
+                self.put(profile)
+                profiles[employee.employee_id] = profile
+        return profiles
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+
+# 全局员工信息缓存
+employee_cache = EmployeeProfileCache()
+
+
+def upsert_employees(db: Session, profiles: Dict[str, dict]) -> list:
+    """写入就餐记录前补齐员工维度表，返回新增或修改过的员工信息
+
+    与缓存一致的员工直接跳过；其余员工用一条 upsert 写入（只覆盖本次提供了值的字段），
+    并发批次写入同一个新员工时不会冲突。返回值应在事务提交成功后再写入缓存。
+    """
+    pending = {}
+    for employee_id, profile in profiles.items():
+        cached = employee_cache.peek(employee_id)
+        if cached is not None and all(
+            value is None or cached.get(key) == value for key, value in profile.items()
+        ):
+            continue
+        pending[employee_id] = profile
+
+    if not pending:
+        return []
+
+    upsert_non_null(db, Employee, [
+        {
+            "employee_id": employee_id,
+            "employee_name": pending[employee_id].get("employee_name"),
+            "avatar_url": pending[employee_id].get("avatar_url")
+        }
+        for employee_id in sorted(pending)
+    ], ["employee_id"], ["employee_name", "avatar_url"])
+
+    # 读取合并后的员工信息（未提供的字段保留数据库中的值）
+    employees = db.query(Employee).filter(
+        Employee.employee_id.in_(list(pending))
+    ).populate_existing()
+    return [_profile(employee) for employee in employees]
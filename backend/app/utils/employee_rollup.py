@@ -0,0 +1,175 @@
+import json
+from collections import Counter
+from datetime import date, datetime
+from decimal import Decimal
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from ..models.canteen import DiningRecord, EmployeeMonthlyStats
+from .streaming import scan_dining_records
+from .upsert import insert_missing
+
+
+def month_start(value) -> date:
+    """返回所在月份的第一天"""
+    return date(value.year, value.month, 1)
+
+
+def next_month(value: date) -> date:
+    """返回下个月的第一天"""
+    if value.month == 12:
+        return date(value.year + 1, 1, 1)
+    return date(value.year, value.month + 1, 1)
+
+
+def dish_names(dishes) -> list:
+    """从就餐记录的菜品字段中取出菜品名称"""
+    if not dishes:
+        return []
+    if isinstance(dishes, str):
+        dishes = json.loads(dishes)
+    return [dish.get('name', '') for dish in dishes if dish.get('name')]
+
+
+def apply_records(db: Session, records) -> None:
+    """将新写入的就餐记录增量累加到员工月度汇总（与记录写入在同一事务内提交）"""
+    deltas = {}
+    for record in records:
+        if not record.employee_id or record.payment_time is None:
+            continue
+        key = (record.employee_id, month_start(record.payment_time))
+        delta = deltas.setdefault(key, {"visits": 0, "spend": Decimal("0"), "dishes": Counter()})
+        delta["visits"] += 1
+        delta["spend"] += Decimal(str(record.payment_amount or 0))
+        delta["dishes"].update(dish_names(record.dishes))
+
+    # 先补齐不存在的汇总行，再逐行加锁累加；按唯一键顺序加锁，避免并发写入互相死锁
+    keys = sorted(deltas)
+    insert_missing(db, EmployeeMonthlyStats, [
+        {
+            "employee_id": employee_id,
+            "month": month,
+            "visit_count": 0,
+            "total_spend": Decimal("0"),
+            "dish_counts": {}
+        }
+        for employee_id, month in keys
+    ], ["employee_id", "month"])
+
+    for employee_id, month in keys:
+        delta = deltas[(employee_id, month)]
+        stats = db.query(EmployeeMonthlyStats).filter(
+            EmployeeMonthlyStats.employee_id == employee_id,
+            EmployeeMonthlyStats.month == month
+        ).with_for_update().one()
+
+        stats.visit_count = (stats.visit_count or 0) + delta["visits"]
+        stats.total_spend = Decimal(str(stats.total_spend or 0)) + delta["spend"]
+        # JSON 字段需要重新赋值才会被识别为已修改
+        dish_counts = Counter(stats.dish_counts or {})
+        dish_counts.update(delta["dishes"])
+        stats.dish_counts = dict(dish_counts)
+
+
+def split_by_month(start: datetime, end: datetime, open_ended: bool = False):
+    """将 [start, end) 拆分为完整月份区间和首尾不足一个月的部分
+
+    open_ended 表示统计截至当前时刻（end 之后还没有就餐记录），此时结束时间所在
+    月份（通常是当月）的汇总行就是该月至今的完整数据，也按完整月份处理。
+    返回 (完整月份的起止月份 [first, last) 或 None, 需要查询明细的时间段列表)
+    """
+    first_full = month_start(start)
+    if datetime.combine(first_full, datetime.min.time()) < start:
+        first_full = next_month(first_full)
+    last_full = month_start(end)
+    if open_ended and datetime.combine(last_full, datetime.min.time()) < end:
+        last_full = next_month(last_full)
+
+    if first_full >= last_full:
+        return None, [(start, end)]
+
+    first_full_start = datetime.combine(first_full, datetime.min.time())
+    last_full_start = datetime.combine(last_full, datetime.min.time())
+    edges = []
+    if start < first_full_start:
+        edges.append((start, first_full_start))
+    if last_full_start < end:
+        edges.append((last_full_start, end))
+    return (first_full, last_full), edges
+
+
+def employee_summary(db: Session, employee_id: str, start: datetime, end: datetime,
+                     open_ended: bool = False) -> dict:
+    """汇总员工在 [start, end) 内的就餐次数、消费和常点菜品"""
+    visits = 0
+    spend = Decimal("0")
+    dishes = Counter()
+    full_months, edges = split_by_month(start, end, open_ended)
+
+    # 完整月份直接读取月度汇总
+    if full_months is not None:
+        rows = db.query(EmployeeMonthlyStats).filter(
+            EmployeeMonthlyStats.employee_id == employee_id,
+            EmployeeMonthlyStats.month >= full_months[0],
+            EmployeeMonthlyStats.month < full_months[1]
+        ).all()
+        for row in rows:
+            visits += row.visit_count or 0
+            spend += Decimal(str(row.total_spend or 0))
+            dishes.update(row.dish_counts or {})
+
+    # 首尾不足一个月的部分通过 (employee_id, payment_time) 索引查询明细
+    for edge_start, edge_end in edges:
+        rows = scan_dining_records(
+            db,
+            [DiningRecord.payment_amount, DiningRecord.dishes],
+            start=edge_start,
+            end=edge_end,
+            criteria=[DiningRecord.employee_id == employee_id]
+        )
+        for row in rows:
+            visits += 1
+            spend += Decimal(str(row.payment_amount or 0))
+            dishes.update(dish_names(row.dishes))
+
+    return {"visits": visits, "spend": spend, "dishes": dishes}
+
+
+def top_spenders(db: Session, start: datetime, end: datetime, limit: int = 10,
+                 open_ended: bool = False) -> list:
+    """统计 [start, end) 内消费最多的员工"""
+    totals = {}
+    full_months, edges = split_by_month(start, end, open_ended)
+
+    def add(employee_id, spend, visits):
+        if not employee_id:
+            return
+        total = totals.setdefault(employee_id, {"employee_id": employee_id, "spend": Decimal("0"), "visits": 0})
+        total["spend"] += Decimal(str(spend or 0))
+        total["visits"] += int(visits or 0)
+
+    if full_months is not None:
+        rows = db.query(
+            EmployeeMonthlyStats.employee_id,
+            func.sum(EmployeeMonthlyStats.total_spend).label('spend'),
+            func.sum(EmployeeMonthlyStats.visit_count).label('visits')
+        ).filter(
+            EmployeeMonthlyStats.month >= full_months[0],
+            EmployeeMonthlyStats.month < full_months[1]
+        ).group_by(EmployeeMonthlyStats.employee_id).all()
+        for row in rows:
+            add(row.employee_id, row.spend, row.visits)
+
+    for edge_start, edge_end in edges:
+        rows = db.query(
+            DiningRecord.employee_id,
+            func.sum(DiningRecord.payment_amount).label('spend'),
+            func.count(DiningRecord.id).label('visits')
+        ).filter(
+            DiningRecord.payment_time >= edge_start,
+            DiningRecord.payment_time < edge_end
+        ).group_by(DiningRecord.employee_id).all()
+        for row in rows:
+            add(row.employee_id, row.spend, row.visits)
+
+    ranked = sorted(totals.values(), key=lambda t: t["spend"], reverse=True)
+    return ranked[:limit]
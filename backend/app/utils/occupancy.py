@@ -0,0 +1,209 @@
+import bisect
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, datetime, timedelta
+from typing import Iterable, List, Optional, Tuple
+from dotenv import load_dotenv
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import Session
+from ..models.canteen import DiningRecord
+from .streaming import scan_dining_records
+
+# 加载环境变量
+load_dotenv()
+
+# 缺少出闸数据时假设的就餐时长（分钟）
+DEFAULT_DWELL_MINUTES = int(os.getenv("DEFAULT_DWELL_MINUTES", "20"))
+DEFAULT_DWELL = timedelta(minutes=DEFAULT_DWELL_MINUTES)
+
+# 就餐时长上限（分钟），出闸事件只关联该时长内的就餐记录，超出的离场时间视为异常
+MAX_DWELL_MINUTES = int(os.getenv("MAX_DWELL_MINUTES", "240"))
+MAX_DWELL = timedelta(minutes=MAX_DWELL_MINUTES)
+
+# 缓存已结束日期的在场人数索引的天数
+OCCUPANCY_CACHE_DAYS = int(os.getenv("OCCUPANCY_CACHE_DAYS", "31"))
+
+# 已结束日期索引的有效期（秒），用于看到其它进程补录的历史数据
+OCCUPANCY_CLOSED_TTL = float(os.getenv("OCCUPANCY_CLOSED_TTL", "3600"))
+
+# 当天（仍在写入）索引的有效期（秒），过期后只重建当天的索引
+OCCUPANCY_OPEN_TTL = float(os.getenv("OCCUPANCY_OPEN_TTL", "5"))
+
+
+class OccupancyIndex:
+    """在场人数索引
+
+    由 (入场时间, 离场时间) 区间构建，入场和离场时间分别排序存放，
+    任意时刻 T 的在场人数 = 入场时间 <= T 的人数 - 离场时间 < T 的人数，
+    通过二分查找在 O(log n) 内得到。
+
+    在场人数只会在入场时刻上升，因此区间内的峰值一定出现在区间起点
+    或某个入场时刻。对每个不同的入场时刻预先计算在场人数，并建立
+    稀疏表（Sparse Table），区间峰值查询只需两次二分查找加 O(1) 比较。
+    """
+
+    def __init__(self, intervals: Iterable[Tuple[datetime, Optional[datetime]]],
+                 default_dwell: timedelta = DEFAULT_DWELL, max_dwell: timedelta = MAX_DWELL):
+        entries = []
+        exits = []
+        for entry_time, exit_time in intervals:
+            if entry_time is None:
+                continue
+            # 没有出闸记录（或数据异常）时按固定就餐时长估算
+            if exit_time is None or exit_time < entry_time:
+                exit_time = entry_time + default_dwell
+            # 超过就餐时长上限的离场时间视为异常，按上限截断
+            exit_time = min(exit_time, entry_time + max_dwell)
+            entries.append(entry_time)
+            exits.append(exit_time)
+
+        entries.sort()
+        exits.sort()
+        self._entries = entries
+        self._exits = exits
+
+        # 峰值候选点：所有不同的入场时刻及其在场人数
+        self._peak_times: List[datetime] = sorted(set(entries))
+        self._peak_counts: List[int] = [self.count_at(t) for t in self._peak_times]
+        self._sparse = self._build_sparse_table(self._peak_counts)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @staticmethod
+    def _build_sparse_table(values: List[int]) -> List[List[int]]:
+        """构建区间最大值稀疏表，table[k][i] 为 [i, i + 2^k) 内最大值的下标"""
+        if not values:
+            return []
+        table = [list(range(len(values)))]
+        k = 1
+        while (1 << k) <= len(values):
+            prev = table[k - 1]
+            half = 1 << (k - 1)
+            row = []
+            for i in range(len(values) - (1 << k) + 1):
+                left, right = prev[i], prev[i + half]
+                # 数值相同时取较早的时刻
+                row.append(left if values[left] >= values[right] else right)
+            table.append(row)
+            k += 1
+        return table
+
+    def _range_argmax(self, left: int, right: int) -> int:
+        """返回 [left, right] 内在场人数最大的候选点下标"""
+        k = (right - left + 1).bit_length() - 1
+        a = self._sparse[k][left]
+        b = self._sparse[k][right - (1 << k) + 1]
+        return a if self._peak_counts[a] >= self._peak_counts[b] else b
+
+    def count_at(self, point: datetime) -> int:
+        """查询某一时刻的在场人数（入场和离场时刻均计为在场）"""
+        entered = bisect.bisect_right(self._entries, point)
+        left = bisect.bisect_left(self._exits, point)
+        return entered - left
+
+    def peak(self, start: datetime, end: datetime) -> Tuple[datetime, int]:
+        """查询 [start, end] 内的在场人数峰值，返回 (峰值时刻, 人数)"""
+        best_time, best_count = start, self.count_at(start)
+        left = bisect.bisect_right(self._peak_times, start)
+        right = bisect.bisect_right(self._peak_times, end) - 1
+        if left <= right:
+            i = self._range_argmax(left, right)
+            if self._peak_counts[i] > best_count:
+                best_time, best_count = self._peak_times[i], self._peak_counts[i]
+        return best_time, best_count
+
+
+def build_occupancy_index(db: Session, start: datetime, end: datetime,
+                          default_dwell: timedelta = DEFAULT_DWELL) -> OccupancyIndex:
+    """从就餐记录构建覆盖 [start, end] 的在场人数索引"""
+    # 只查询需要的两列；包含在 start 之前入场但仍在场的记录（最多早 MAX_DWELL）
+    rows = scan_dining_records(
+        db,
+        [DiningRecord.payment_time, DiningRecord.exit_time],
+        start=start - MAX_DWELL,
+        criteria=[
+            DiningRecord.payment_time <= end,
+            or_(
+                DiningRecord.exit_time >= start,
+                and_(
+                    DiningRecord.exit_time.is_(None),
+                    DiningRecord.payment_time >= start - default_dwell
+                )
+            )
+        ]
+    )
+    return OccupancyIndex(rows, default_dwell)
+
+
+def _day_start(day: date) -> datetime:
+    return datetime.combine(day, datetime.min.time())
+
+
+class OccupancyCache:
+    """按天缓存的在场人数索引
+
+    每天的索引覆盖 [当天 0 点, 次日 0 点]，已结束的日期数据基本不再变化，
+    缓存 OCCUPANCY_CLOSED_TTL 秒；当天仍在写入，只缓存 OCCUPANCY_OPEN_TTL 秒，
+    过期后只重建当天的索引。本进程写入历史日期的数据时应调用 invalidate。
+    """
+
+    def __init__(self, capacity: int = OCCUPANCY_CACHE_DAYS, closed_ttl: float = OCCUPANCY_CLOSED_TTL,
+                 open_ttl: float = OCCUPANCY_OPEN_TTL):
+        self.capacity = capacity
+        self.closed_ttl = closed_ttl
+        self.open_ttl = open_ttl
+        self._items = OrderedDict()     # 日期 -> (过期时刻, 索引)
+        self._lock = threading.Lock()
+
+    def day_index(self, db: Session, day: date) -> OccupancyIndex:
+        """获取某一天的在场人数索引，缓存缺失或过期时重新构建"""
+        with self._lock:
+            item = self._items.get(day)
+            if item is not None and time.monotonic() < item[0]:
+                self._items.move_to_end(day)
+                return item[1]
+
+        # 有效期按构建时是否已结束决定，跨过零点前构建的当天索引仍会很快过期
+        ttl = self.open_ttl if day >= date.today() else self.closed_ttl
+        index = build_occupancy_index(db, _day_start(day), _day_start(day + timedelta(days=1)))
+        with self._lock:
+            self._items[day] = (time.monotonic() + ttl, index)
+            self._items.move_to_end(day)
+            while len(self._items) > self.capacity:
+                self._items.popitem(last=False)
+        return index
+
+    def count_at(self, db: Session, point: datetime) -> int:
+        """查询某一时刻的在场人数"""
+        return self.day_index(db, point.date()).count_at(point)
+
+    def peak(self, db: Session, start: datetime, end: datetime) -> Tuple[datetime, int]:
+        """查询 [start, end] 内的在场人数峰值，跨天时逐天查询后取最大值"""
+        best_time, best_count = start, -1
+        day = start.date()
+        while day <= end.date():
+            segment_start = max(start, _day_start(day))
+            segment_end = min(end, _day_start(day + timedelta(days=1)))
+            peak_time, peak_count = self.day_index(db, day).peak(segment_start, segment_end)
+            if peak_count > best_count:
+                best_time, best_count = peak_time, peak_count
+            day += timedelta(days=1)
+        return best_time, max(best_count, 0)
+
+    def invalidate(self, start: datetime, end: datetime):
+        """丢弃 [start, end] 涉及的日期的索引（写入或修改历史记录后调用）"""
+        with self._lock:
+            for day in list(self._items):
+                if start.date() <= day <= end.date():
+                    del self._items[day]
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+
+# 全局在场人数索引缓存
+occupancy_cache = OccupancyCache()
@@ -0,0 +1,106 @@
+import asyncio
+import os
+import time
+from dotenv import load_dotenv
+from starlette.concurrency import run_in_threadpool
+from ..models.database import ReadSessionLocal
+
+# 加载环境变量
+load_dotenv()
+
+# 合并请求的时间桶（秒），同一时间桶内参数相同的请求共享一次计算
+COALESCE_BUCKET_SECONDS = float(os.getenv("COALESCE_BUCKET_SECONDS", "1"))
+
+# 每个进行中的计算最多允许排队等待的请求数
+COALESCE_MAX_WAITERS = int(os.getenv("COALESCE_MAX_WAITERS", "200"))
+
+# 同时进行中的不同计算数量上限，超过后直接拒绝新请求（降载）
+COALESCE_MAX_INFLIGHT = int(os.getenv("COALESCE_MAX_INFLIGHT", "32"))
+
+
+class LoadSheddingError(Exception):
+    """排队请求过多时拒绝服务"""
+
+
+class SingleFlight:
+    """相同请求合并（single-flight）
+
+    参数相同且落在同一时间桶内的并发请求只执行一次计算，其余请求等待
+    同一个结果。计算在线程池中执行，不阻塞事件循环。
+    """
+
+    def __init__(self, bucket_seconds=COALESCE_BUCKET_SECONDS, max_waiters=COALESCE_MAX_WAITERS,
+                 max_inflight=COALESCE_MAX_INFLIGHT):
+        self.bucket_seconds = bucket_seconds
+        self.max_waiters = max_waiters
+        self.max_inflight = max_inflight
+        self._calls = {}
+        self._stats = {"executed": 0, "shared": 0, "shed": 0}
+
+    def _bucket(self):
+        if self.bucket_seconds <= 0:
+            return 0
+        return int(time.time() // self.bucket_seconds)
+
+    async def run(self, key, fn, *args):
+        """执行或加入一次计算，返回计算结果"""
+        call_key = (key, self._bucket())
+        call = self._calls.get(call_key)
+
+        if call is not None:
+            if call["waiters"] >= self.max_waiters:
+                self._stats["shed"] += 1
+                raise LoadSheddingError(f"请求排队数超过上限 {self.max_waiters}")
+            call["waiters"] += 1
+            self._stats["shared"] += 1
+        else:
+            if len(self._calls) >= self.max_inflight:
+                self._stats["shed"] += 1
+                raise LoadSheddingError(f"进行中的计算数超过上限 {self.max_inflight}")
+            task = asyncio.ensure_future(run_in_threadpool(fn, *args))
+            call = self._calls[call_key] = {"task": task, "waiters": 0}
+            task.add_done_callback(lambda _: self._calls.pop(call_key, None))
+            self._stats["executed"] += 1
+
+        # shield 保证某个客户端断开时不会取消其他请求共享的计算
+        return await asyncio.shield(call["task"])
+
+    def stats(self):
+        """返回合并统计"""
+        return {
+            **self._stats,
+            "inflight": len(self._calls),
+            "waiting": sum(call["waiters"] for call in self._calls.values()),
+            "bucket_seconds": self.bucket_seconds,
+            "max_waiters": self.max_waiters,
+            "max_inflight": self.max_inflight
+        }
+
+
+# 大屏数据接口共用的合并器
+dashboard_flight = SingleFlight()
+
+
+def with_read_session(fn, *args):
+    """在共享计算内部创建并关闭只读会话
+
+    共享计算可能在发起请求被取消后继续执行，也被其它请求共用，
+    不能借用某个请求的会话（请求结束时会在另一个线程中关闭它）。
+    """
+    db = ReadSessionLocal()
+    try:
+        return fn(db, *args)
+    finally:
+        db.close()
+
+
+async def run_coalesced(key, fn, *args):
+    """通过合并器执行计算，降载时返回 503 响应"""
+    try:
+        return await dashboard_flight.run(key, fn, *args)
+    except LoadSheddingError as e:
+        print(f"请求被降载: {e}")
+        return {
+            "code": 503,
+            "message": str(e)
+        }
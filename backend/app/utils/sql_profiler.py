@@ -0,0 +1,353 @@
+import os
+import queue
+import random
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from dotenv import load_dotenv
+from sqlalchemy import event, inspect
+from ..models.database import Base, engine, replica_engine
+
+# 加载环境变量
+load_dotenv()
+
+# 是否开启 SQL 性能分析（默认关闭）
+SQL_PROFILE_ENABLED = os.getenv("SQL_PROFILE", "false").lower() in ("1", "true", "yes")
+
+# 慢查询阈值（毫秒），超过该阈值的查询会被记录并采样 EXPLAIN
+SQL_SLOW_QUERY_MS = float(os.getenv("SQL_SLOW_QUERY_MS", "200"))
+
+# 慢查询执行 EXPLAIN 的采样比例（0-1）
+SQL_EXPLAIN_SAMPLE_RATE = float(os.getenv("SQL_EXPLAIN_SAMPLE_RATE", "1.0"))
+
+# 最多保留的慢查询条数
+SQL_SLOW_QUERY_LIMIT = int(os.getenv("SQL_SLOW_QUERY_LIMIT", "100"))
+
+# 最多统计的不同语句数量，防止统计表无限增长
+SQL_STATEMENT_LIMIT = 500
+
+# 等待执行 EXPLAIN 的慢查询数量上限，超出时丢弃
+SQL_EXPLAIN_QUEUE_SIZE = 100
+
+
+class SQLProfiler:
+    """基于 SQLAlchemy 引擎事件的 SQL 性能分析器
+
+    记录每条语句的执行次数、耗时和行数。返回结果集的语句（SELECT 等）在执行后
+    用 ProfiledCursor 包装游标，结果被读完或关闭时才记录读取的行数和包含读取
+    在内的总耗时，流式读取（yield_per）的耗时不会只算到第一批数据返回为止；
+    其它语句记录影响的行数。超过慢查询阈值的 SELECT 按采样比例放入队列，由后台线程在单独的连接上执行
+    EXPLAIN 并标记出全表扫描。不能在原连接上执行：流式读取（yield_per）时原连接
+    上还有未读完的结果集，发送新语句会使该结果集被丢弃。
+    """
+
+    def __init__(self, slow_query_ms=SQL_SLOW_QUERY_MS, explain_sample_rate=SQL_EXPLAIN_SAMPLE_RATE,
+                 slow_query_limit=SQL_SLOW_QUERY_LIMIT):
+        self.slow_query_ms = slow_query_ms
+        self.explain_sample_rate = explain_sample_rate
+        self.stats = {}
+        self.slow_queries = deque(maxlen=slow_query_limit)
+        self.plans = {}
+        self.index_report = []
+        self._lock = threading.Lock()
+        self._engines = []
+        self._explain_queue = queue.Queue(maxsize=SQL_EXPLAIN_QUEUE_SIZE)
+        self._explain_thread = None
+
+    def attach(self, bind):
+        """在引擎上注册执行事件"""
+        if bind is None or bind in self._engines:
+            return
+        event.listen(bind, "before_cursor_execute", self._before_execute)
+        event.listen(bind, "after_cursor_execute", self._after_execute)
+        self._engines.append(bind)
+        if self._explain_thread is None:
+            self._explain_thread = threading.Thread(target=self._explain_worker, name="sql-explain", daemon=True)
+            self._explain_thread.start()
+
+    def reset(self):
+        """清空已收集的统计数据"""
+        with self._lock:
+            self.stats.clear()
+            self.slow_queries.clear()
+            self.plans.clear()
+
+    def _before_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start_time", []).append(time.perf_counter())
+
+    def _after_execute(self, conn, cursor, statement, parameters, context, executemany):
+        starts = conn.info.get("query_start_time")
+        if not starts:
+            return
+        started = starts.pop()
+        # EXPLAIN 语句本身不计入统计
+        if conn.info.get("explaining"):
+            return
+
+        if cursor.description is not None and context is not None:
+            # 结果集读完或关闭时再记录；CursorResult 在本事件之后才由 context.cursor 创建
+            context.cursor = ProfiledCursor(
+                cursor, self, conn.engine, statement, parameters, executemany, started
+            )
+            return
+        self.record(conn.engine, statement, parameters, executemany,
+                    (time.perf_counter() - started) * 1000, self._affected_rows(cursor))
+
+    def record(self, bind, statement, parameters, executemany, elapsed_ms, rows):
+        """记录一次语句执行，超过慢查询阈值时记入慢查询并按采样比例排队执行 EXPLAIN"""
+        with self._lock:
+            stat = self.stats.get(statement)
+            if stat is None:
+                if len(self.stats) >= SQL_STATEMENT_LIMIT:
+                    return
+                stat = self.stats[statement] = {
+                    "statement": statement,
+                    "count": 0,
+                    "total_ms": 0.0,
+                    "max_ms": 0.0,
+                    "rows": 0
+                }
+            stat["count"] += 1
+            stat["total_ms"] += elapsed_ms
+            stat["max_ms"] = max(stat["max_ms"], elapsed_ms)
+            if rows is not None:
+                stat["rows"] += rows
+
+        if elapsed_ms < self.slow_query_ms:
+            return
+
+        if (not executemany and statement.lstrip().upper().startswith("SELECT")
+                and random.random() < self.explain_sample_rate):
+            try:
+                self._explain_queue.put_nowait((bind, statement, parameters))
+            except queue.Full:
+                pass
+
+        with self._lock:
+            self.slow_queries.append({
+                "statement": statement,
+                "elapsed_ms": round(elapsed_ms, 2),
+                "rows": rows,
+                "full_scan": self.plans.get(statement, {}).get("full_scan"),
+                "time": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            })
+
+    @staticmethod
+    def _affected_rows(cursor):
+        """返回 INSERT / UPDATE / DELETE 影响的行数，驱动无法提供时返回 None"""
+        rowcount = cursor.rowcount
+        # SQLite 未知时为 -1，pymysql 流式游标为无符号的 -1
+        if rowcount is None or rowcount < 0 or rowcount >= 2 ** 63 - 1:
+            return None
+        return rowcount
+
+    def _explain_worker(self):
+        """后台线程：依次对队列中的慢查询执行 EXPLAIN"""
+        while True:
+            bind, statement, parameters = self._explain_queue.get()
+            try:
+                plan = self._explain(bind, statement, parameters)
+                if plan is not None:
+                    with self._lock:
+                        self.plans[statement] = plan
+                        for query in self.slow_queries:
+                            if query["statement"] == statement and query["full_scan"] is None:
+                                query["full_scan"] = plan["full_scan"]
+            finally:
+                self._explain_queue.task_done()
+
+    def _explain(self, bind, statement, parameters):
+        """在单独的连接上对慢查询执行 EXPLAIN，返回执行计划及是否全表扫描"""
+        dialect = bind.dialect.name
+        prefix = "EXPLAIN QUERY PLAN " if dialect == "sqlite" else "EXPLAIN "
+        try:
+            with bind.connect() as conn:
+                conn.info["explaining"] = True
+                try:
+                    result = conn.exec_driver_sql(prefix + statement, parameters)
+                    rows = [dict(row) for row in result.mappings()]
+                finally:
+                    conn.info["explaining"] = False
+        except Exception as e:
+            print(f"执行 EXPLAIN 出错: {e}")
+            return None
+
+        if dialect == "sqlite":
+            # SQLite: "SCAN 表名" 且没有使用索引即为全表扫描
+            full_scan = any(
+                str(row.get("detail", "")).startswith("SCAN")
+                and "INDEX" not in str(row.get("detail", ""))
+                for row in rows
+            )
+        elif dialect == "mysql":
+            # MySQL: 访问类型为 ALL 即为全表扫描
+            full_scan = any(str(row.get("type", "")).upper() == "ALL" for row in rows)
+        else:
+            full_scan = None
+
+        return {"plan": rows, "full_scan": full_scan}
+
+    def report(self, limit=20):
+        """返回按总耗时排序的统计报告"""
+        with self._lock:
+            statements = sorted(self.stats.values(), key=lambda s: s["total_ms"], reverse=True)[:limit]
+            return {
+                "enabled": bool(self._engines),
+                "slow_query_ms": self.slow_query_ms,
+                "statements": [
+                    {
+                        **stat,
+                        "total_ms": round(stat["total_ms"], 2),
+                        "max_ms": round(stat["max_ms"], 2),
+                        "avg_ms": round(stat["total_ms"] / stat["count"], 2) if stat["count"] else 0,
+                        "full_scan": self.plans.get(stat["statement"], {}).get("full_scan")
+                    }
+                    for stat in statements
+                ],
+                "slow_queries": list(self.slow_queries),
+                "plans": [
+                    {"statement": statement, **plan}
+                    for statement, plan in self.plans.items()
+                ],
+                "indexes": self.index_report
+            }
+
+
+class ProfiledCursor:
+    """统计读取行数的 DBAPI 游标代理
+
+    结果集通过 fetchone / fetchmany / fetchall 读取，累计读取的行数；
+    游标关闭（结果读完、调用 first() 或结果被关闭）时把总耗时和行数交给分析器。
+    """
+
+    def __init__(self, cursor, profiler, bind, statement, parameters, executemany, started):
+        self._cursor = cursor
+        self._profiler = profiler
+        self._bind = bind
+        self._statement = statement
+        self._parameters = parameters
+        self._executemany = executemany
+        self._started = started
+        self._rows = 0
+        self._recorded = False
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __iter__(self):
+        for row in self._cursor:
+            self._rows += 1
+            yield row
+
+    def fetchone(self):
+        row = self._cursor.fetchone()
+        if row is not None:
+            self._rows += 1
+        return row
+
+    def fetchmany(self, *args, **kwargs):
+        rows = self._cursor.fetchmany(*args, **kwargs)
+        self._rows += len(rows)
+        return rows
+
+    def fetchall(self):
+        rows = self._cursor.fetchall()
+        self._rows += len(rows)
+        return rows
+
+    def close(self):
+        try:
+            self._cursor.close()
+        finally:
+            self._finish()
+
+    def __del__(self):
+        # 未读完也未关闭就被丢弃的结果集，在回收时记录已读取的部分
+        try:
+            self._finish()
+        except Exception:
+            pass
+
+    def _finish(self):
+        if self._recorded:
+            return
+        self._recorded = True
+        elapsed_ms = (time.perf_counter() - self._started) * 1000
+        self._profiler.record(self._bind, self._statement, self._parameters, self._executemany,
+                              elapsed_ms, self._rows)
+
+
+def check_indexes(bind, metadata=Base.metadata):
+    """比较 ORM 模型声明的索引与数据库中实际存在的索引"""
+    inspector = inspect(bind)
+    existing_tables = set(inspector.get_table_names())
+    report = []
+
+    for table in metadata.sorted_tables:
+        if table.name not in existing_tables:
+            report.append({"table": table.name, "exists": False, "missing": [], "extra": [], "mismatched": []})
+            continue
+
+        primary_key = tuple(column.name for column in table.primary_key.columns)
+        declared = {
+            index.name: tuple(column.name for column in index.columns)
+            for index in table.indexes
+        }
+        live = {
+            index["name"]: tuple(index["column_names"])
+            for index in inspector.get_indexes(table.name)
+        }
+
+        # 与主键列相同的索引由主键覆盖，不视为缺失
+        missing = [
+            {"name": name, "columns": list(columns)}
+            for name, columns in declared.items()
+            if name not in live and columns != primary_key
+        ]
+        extra = [
+            {"name": name, "columns": list(columns)}
+            for name, columns in live.items()
+            if name not in declared
+        ]
+        mismatched = [
+            {"name": name, "declared": list(columns), "live": list(live[name])}
+            for name, columns in declared.items()
+            if name in live and live[name] != columns
+        ]
+        report.append({
+            "table": table.name,
+            "exists": True,
+            "missing": missing,
+            "extra": extra,
+            "mismatched": mismatched
+        })
+
+    return report
+
+
+# 全局性能分析器实例
+profiler = SQLProfiler()
+
+
+def setup_sql_profiling():
+    """启动时挂载性能分析器并检查索引一致性"""
+    try:
+        profiler.index_report = check_indexes(engine)
+    except Exception as e:
+        print(f"检查索引一致性出错: {e}")
+
+    # 索引检查完成后再挂载，避免反射查询混入统计
+    if SQL_PROFILE_ENABLED:
+        profiler.attach(engine)
+        profiler.attach(replica_engine)
+        print(f"SQL 性能分析已开启，慢查询阈值 {profiler.slow_query_ms}ms")
+
+    for table in profiler.index_report:
+        if not table["exists"]:
+            print(f"索引检查: 表 {table['table']} 不存在")
+        for index in table["missing"]:
+            print(f"索引检查: 表 {table['table']} 缺少索引 {index['name']} {index['columns']}")
+        for index in table["mismatched"]:
+            print(f"索引检查: 表 {table['table']} 索引 {index['name']} 列不一致，"
+                  f"模型 {index['declared']}，数据库 {index['live']}")
@@ -0,0 +1,80 @@
+import json
+import os
+from datetime import datetime
+from typing import Iterable, Iterator, Optional
+from dotenv import load_dotenv
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import Session
+from ..models.canteen import DiningRecord
+
+# 加载环境变量
+load_dotenv()
+
+# 流式读取时每批从数据库取回的行数
+SCAN_CHUNK_SIZE = int(os.getenv("SCAN_CHUNK_SIZE", "1000"))
+
+
+def stream_query(query, chunk_size: int = SCAN_CHUNK_SIZE) -> Iterator:
+    """以服务端游标分批读取查询结果，内存占用与结果总量无关
+
+    yield_per 会同时开启 stream_results（MySQL 下使用 SSCursor），
+    每次只在内存中保留 chunk_size 行。遍历结束前不要在同一会话上执行其它查询。
+    """
+    return iter(query.yield_per(chunk_size))
+
+
+def scan_dining_records(db: Session, columns, start: Optional[datetime] = None,
+                        end: Optional[datetime] = None, criteria: Iterable = (),
+                        chunk_size: int = SCAN_CHUNK_SIZE) -> Iterator:
+    """流式扫描 [start, end) 内的就餐记录，只查询指定的列"""
+    query = db.query(*columns)
+    if start is not None:
+        query = query.filter(DiningRecord.payment_time >= start)
+    if end is not None:
+        query = query.filter(DiningRecord.payment_time < end)
+    for criterion in criteria:
+        query = query.filter(criterion)
+    return stream_query(query, chunk_size)
+
+
+def iter_dishes(rows: Iterable) -> Iterator[dict]:
+    """从包含 dishes 列的行中逐个取出菜品，跳过无法解析的记录"""
+    for row in rows:
+        if not row.dishes:
+            continue
+        try:
+            dishes = json.loads(row.dishes) if isinstance(row.dishes, str) else row.dishes
+        except Exception as e:
+            print(f"处理菜品数据出错: {e}")
+            continue
+        for dish in dishes:
+            if dish.get('name'):
+                yield dish
+
+
+def iter_keyset_chunks(db: Session, columns, start: datetime, end: datetime,
+                       chunk_size: int = SCAN_CHUNK_SIZE) -> Iterator[list]:
+    """按 (payment_time, id) 键集分页读取 [start, end) 内的就餐记录
+
+    每页是一条独立的短查询（走 idx_payment_time 索引，从上一页最后一行之后继续），
+    不会长时间占用游标，适合边读边向客户端输出的大批量导出。
+    columns 中必须包含 DiningRecord.payment_time 和 DiningRecord.id。
+    """
+    last = None
+    while True:
+        query = db.query(*columns).filter(
+            DiningRecord.payment_time >= start,
+            DiningRecord.payment_time < end
+        )
+        if last is not None:
+            query = query.filter(or_(
+                DiningRecord.payment_time > last[0],
+                and_(DiningRecord.payment_time == last[0], DiningRecord.id > last[1])
+            ))
+        rows = query.order_by(DiningRecord.payment_time, DiningRecord.id).limit(chunk_size).all()
+        if not rows:
+            return
+        yield rows
+        if len(rows) < chunk_size:
+            return
+        last = (rows[-1].payment_time, rows[-1].id)
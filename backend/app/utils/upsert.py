@@ -0,0 +1,83 @@
+from typing import List
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+
+def insert_missing(db: Session, model, rows: List[dict], key_columns: List[str]):
+    """插入唯一键不存在的行，已存在的行（包括并发事务刚插入的）保持不变
+
+    先确保行存在、再 SELECT ... FOR UPDATE 读取修改，避免两个事务都读不到行后
+    同时插入导致唯一键冲突（InnoDB 下还可能因间隙锁死锁）而回滚整批写入。
+    调用方应按唯一键排序 rows，使并发事务以相同顺序加锁。
+    """
+    if not rows:
+        return
+    table = model.__table__
+    dialect = db.get_bind().dialect.name
+
+    if dialect == "mysql":
+        from sqlalchemy.dialects.mysql import insert
+        statement = insert(table).values(rows)
+        # 重复时把唯一键赋值为自身，即不修改已有的行
+        db.execute(statement.on_duplicate_key_update(
+            {key_columns[0]: statement.inserted[key_columns[0]]}
+        ))
+    elif dialect in ("sqlite", "postgresql"):
+        if dialect == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert
+        db.execute(insert(table).values(rows).on_conflict_do_nothing(index_elements=key_columns))
+    else:
+        for row in rows:
+            try:
+                with db.begin_nested():
+                    db.execute(table.insert().values(row))
+            except IntegrityError:
+                pass
+
+
+def upsert_non_null(db: Session, model, rows: List[dict], key_columns: List[str],
+                    update_columns: List[str]):
+    """插入或更新行：唯一键已存在时只用本次提供了值（非 None）的字段覆盖已有的值
+
+    同一条 INSERT ... ON DUPLICATE KEY UPDATE / ON CONFLICT DO UPDATE 完成，
+    并发写入同一个新键时不会因唯一键冲突回滚。调用方应按唯一键排序 rows。
+    """
+    if not rows:
+        return
+    table = model.__table__
+    dialect = db.get_bind().dialect.name
+
+    if dialect == "mysql":
+        from sqlalchemy.dialects.mysql import insert
+        statement = insert(table).values(rows)
+        db.execute(statement.on_duplicate_key_update({
+            column: func.coalesce(statement.inserted[column], table.c[column])
+            for column in update_columns
+        }))
+    elif dialect in ("sqlite", "postgresql"):
+        if dialect == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert
+        statement = insert(table).values(rows)
+        db.execute(statement.on_conflict_do_update(
+            index_elements=key_columns,
+            set_={
+                column: func.coalesce(statement.excluded[column], table.c[column])
+                for column in update_columns
+            }
+        ))
+    else:
+        for row in rows:
+            try:
+                with db.begin_nested():
+                    db.execute(table.insert().values(row))
+            except IntegrityError:
+                values = {column: row[column] for column in update_columns if row.get(column) is not None}
+                if values:
+                    db.execute(table.update().where(
+                        *(table.c[column] == row[column] for column in key_columns)
+                    ).values(values))
@@ -1,6 +1,10 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from app.routers import dish, weather, dining, satisfaction
+from fastapi.middleware.gzip import GZipMiddleware
+from app.routers import dish, weather, dining, satisfaction, employee, debug
+from app.utils.sql_profiler import setup_sql_profiling
+from app.utils.compression import COMPRESS_MIN_SIZE
+from app.utils.comment_index import comment_index
 import uvicorn
 from fastapi_cache import FastAPICache
 from fastapi_cache.backends.inmemory import InMemoryBackend
@@ -16,14 +20,22 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# 其余接口的响应压缩；大屏接口已自行按数据版本缓存压缩结果（带 Content-Encoding 的响应会被跳过）
+app.add_middleware(GZipMiddleware, minimum_size=COMPRESS_MIN_SIZE)
+
 app.include_router(dish.router, prefix="/api")
 app.include_router(weather.router, prefix="/api")
 app.include_router(dining.router, prefix="/api")
 app.include_router(satisfaction.router, prefix="/api")
+app.include_router(employee.router, prefix="/api")
+if debug.DEBUG_ENDPOINTS_ENABLED:
+    app.include_router(debug.router, prefix="/api")
 
 @app.on_event("startup")
 async def startup():
     FastAPICache.init(InMemoryBackend())
+    setup_sql_profiling()
+    comment_index.warm_up()
 
 if __name__ == "__main__":
     uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True) 
\ No newline at end of file
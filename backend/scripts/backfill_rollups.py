@@ -0,0 +1,362 @@
+"""汇总表回填 / 重建工具
+
+按天切分历史就餐记录，在进程池中并行计算每天的部分汇总，按汇总表的
+主键粒度（如员工月度汇总按月）合并后整体替换写入，重复执行结果一致。
+每完成一个月就写入检查点文件，中断后再次执行会跳过已完成的月份。
+完成后可抽样与明细重新计算的结果比对。
+
+使用示例:
+    python scripts/backfill_rollups.py --workers 8
+    python scripts/backfill_rollups.py --start 2024-01-01 --end 2024-12-31 --verify 50
+    python scripts/backfill_rollups.py --rebuild          # 忽略检查点，全部重建
+    python scripts/backfill_rollups.py --verify-only 100  # 只做抽样校验
+
+注意：回填会整月替换汇总数据，重建当月数据时应暂停写入，
+否则回填期间新写入记录的增量更新可能被覆盖。
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import func
+
+from app.models.database import SessionLocal
+from app.models.canteen import DiningRecord, EmployeeMonthlyStats
+from app.utils.employee_rollup import month_start, next_month, dish_names
+from app.utils.streaming import scan_dining_records
+
+
+class EmployeeMonthlyRollup:
+    """员工月度汇总（employee_monthly_stats）"""
+
+    name = "employee_monthly"
+
+    def compute_day(self, db, day):
+        """计算一天的部分汇总 {员工ID: [就餐次数, 消费总额, {菜品名: 次数}]}"""
+        day_start = datetime.combine(day, datetime.min.time())
+        partial = {}
+        rows = scan_dining_records(
+            db,
+            [DiningRecord.employee_id, DiningRecord.payment_amount, DiningRecord.dishes],
+            start=day_start,
+            end=day_start + timedelta(days=1)
+        )
+        for row in rows:
+            if not row.employee_id:
+                continue
+            stats = partial.setdefault(row.employee_id, [0, "0", {}])
+            stats[0] += 1
+            stats[1] = str(Decimal(stats[1]) + Decimal(str(row.payment_amount or 0)))
+            for name in dish_names(row.dishes):
+                stats[2][name] = stats[2].get(name, 0) + 1
+        return partial
+
+    def merge(self, merged, partial):
+        """将一天的部分汇总合并进当月汇总"""
+        for employee_id, (visits, spend, dishes) in partial.items():
+            stats = merged.setdefault(employee_id, [0, Decimal("0"), Counter()])
+            stats[0] += visits
+            stats[1] += Decimal(spend)
+            stats[2].update(dishes)
+
+    def write_month(self, db, month, merged):
+        """整月替换写入汇总数据（同一事务内先删后插，可重复执行）"""
+        db.query(EmployeeMonthlyStats).filter(EmployeeMonthlyStats.month == month).delete(
+            synchronize_session=False
+        )
+        now = datetime.now()
+        rows = [
+            {
+                "employee_id": employee_id,
+                "month": month,
+                "visit_count": visits,
+                "total_spend": spend,
+                "dish_counts": dict(dishes),
+                "updated_at": now
+            }
+            for employee_id, (visits, spend, dishes) in merged.items()
+        ]
+        if rows:
+            db.execute(EmployeeMonthlyStats.__table__.insert(), rows)
+        db.commit()
+        return len(rows)
+
+    def _raw_sample_keys(self, db, size, months=None):
+        """从明细中随机抽取 (员工ID, 月份)：按随机 ID 定位就餐记录（主键查找），去重后返回
+
+        汇总表中缺失的员工月份只能从明细一侧发现。
+        """
+        query = db.query(func.min(DiningRecord.id), func.max(DiningRecord.id))
+        if months:
+            query = query.filter(
+                DiningRecord.payment_time >= datetime.combine(min(months), datetime.min.time()),
+                DiningRecord.payment_time < datetime.combine(next_month(max(months)), datetime.min.time())
+            )
+        low, high = query.one()
+        if low is None:
+            return []
+
+        keys = set()
+        attempts = 0
+        while len(keys) < size and attempts < size * 5:
+            attempts += 1
+            row = db.query(DiningRecord.employee_id, DiningRecord.payment_time).filter(
+                DiningRecord.id >= random.randint(low, high)
+            ).order_by(DiningRecord.id).first()
+            if row is None or not row.employee_id or row.payment_time is None:
+                continue
+            month = month_start(row.payment_time)
+            if months and month not in months:
+                continue
+            keys.add((row.employee_id, month))
+        return list(keys)
+
+    def verify_sample(self, db, size, months=None):
+        """抽样比对汇总数据与明细重新计算的结果，返回 (抽样数, 不一致列表)
+
+        一半样本取自汇总表，另一半取自明细中的 (员工ID, 月份)，汇总表缺失的行记为不一致。
+        """
+        sample = set(self._raw_sample_keys(db, size - size // 2, months))
+
+        query = db.query(EmployeeMonthlyStats.employee_id, EmployeeMonthlyStats.month)
+        if months:
+            query = query.filter(EmployeeMonthlyStats.month.in_(months))
+        keys = [tuple(key) for key in query.all() if tuple(key) not in sample]
+        sample.update(random.sample(keys, min(size - len(sample), len(keys))))
+
+        mismatches = []
+        for employee_id, month in sample:
+            stats = db.query(EmployeeMonthlyStats).filter(
+                EmployeeMonthlyStats.employee_id == employee_id,
+                EmployeeMonthlyStats.month == month
+            ).first()
+
+            month_begin = datetime.combine(month, datetime.min.time())
+            month_end = datetime.combine(next_month(month), datetime.min.time())
+            visits = 0
+            spend = Decimal("0")
+            dishes = Counter()
+            rows = scan_dining_records(
+                db,
+                [DiningRecord.payment_amount, DiningRecord.dishes],
+                start=month_begin,
+                end=month_end,
+                criteria=[DiningRecord.employee_id == employee_id]
+            )
+            for row in rows:
+                visits += 1
+                spend += Decimal(str(row.payment_amount or 0))
+                dishes.update(dish_names(row.dishes))
+
+            expected = (visits, spend, dict(dishes))
+            if stats is None:
+                mismatches.append({
+                    "employee_id": employee_id,
+                    "month": month.isoformat(),
+                    "expected": [visits, str(spend), dict(dishes)],
+                    "actual": None
+                })
+                continue
+            actual = (stats.visit_count, Decimal(str(stats.total_spend)), dict(stats.dish_counts or {}))
+            if expected != actual:
+                mismatches.append({
+                    "employee_id": employee_id,
+                    "month": month.isoformat(),
+                    "expected": [visits, str(spend), dict(dishes)],
+                    "actual": [actual[0], str(actual[1]), actual[2]]
+                })
+        return len(sample), mismatches
+
+
+# 可回填的汇总表，新增汇总时在这里注册
+ROLLUPS = {
+    EmployeeMonthlyRollup.name: EmployeeMonthlyRollup()
+}
+
+
+def compute_day_partial(rollup_name, day_iso):
+    """进程池任务：计算一天的部分汇总"""
+    rollup = ROLLUPS[rollup_name]
+    db = SessionLocal()
+    try:
+        return day_iso, rollup.compute_day(db, date.fromisoformat(day_iso))
+    finally:
+        db.close()
+
+
+def load_checkpoint(path, rollup_name):
+    """读取检查点，返回已完成的月份集合"""
+    if not path or not os.path.exists(path):
+        return set()
+    with open(path, encoding="utf-8") as f:
+        checkpoint = json.load(f)
+    if checkpoint.get("rollup") != rollup_name:
+        print(f"检查点 {path} 属于 {checkpoint.get('rollup')}，忽略")
+        return set()
+    return set(checkpoint.get("completed_months", []))
+
+
+def save_checkpoint(path, rollup_name, completed):
+    """原子写入检查点"""
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({
+            "rollup": rollup_name,
+            "completed_months": sorted(completed),
+            "updated_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        }, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+def history_range():
+    """获取就餐记录的最早和最晚日期"""
+    db = SessionLocal()
+    try:
+        first, last = db.query(
+            func.min(DiningRecord.payment_time),
+            func.max(DiningRecord.payment_time)
+        ).one()
+    finally:
+        db.close()
+    if first is None:
+        return None, None
+    return first.date(), last.date()
+
+
+def month_days(month, start, end):
+    """返回某月在 [start, end] 内的所有日期"""
+    day = max(month, start)
+    last = min(next_month(month) - timedelta(days=1), end)
+    days = []
+    while day <= last:
+        days.append(day)
+        day += timedelta(days=1)
+    return days
+
+
+def backfill(rollup, start, end, workers, checkpoint_path, rebuild):
+    """并行回填 [start, end] 内的汇总数据，返回本次处理的月份"""
+    completed = set() if rebuild else load_checkpoint(checkpoint_path, rollup.name)
+
+    # 汇总按整月替换，起止日期扩展到整月
+    start = month_start(start)
+    end = next_month(month_start(end)) - timedelta(days=1)
+
+    pending = {}
+    month = start
+    while month <= end:
+        if month.isoformat() not in completed:
+            pending[month] = month_days(month, start, end)
+        month = next_month(month)
+
+    if not pending:
+        print("所有月份均已完成，无需回填")
+        return []
+
+    total_days = sum(len(days) for days in pending.values())
+    print(f"待回填 {len(pending)} 个月 / {total_days} 天，已完成 {len(completed)} 个月，进程数 {workers}")
+
+    merged = {month: {} for month in pending}
+    remaining = {month: len(days) for month, days in pending.items()}
+    processed = []
+    started = time.monotonic()
+    done_days = 0
+
+    # 使用 spawn 启动子进程，避免继承父进程的数据库连接
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+        futures = [
+            executor.submit(compute_day_partial, rollup.name, day.isoformat())
+            for days in pending.values() for day in days
+        ]
+        db = SessionLocal()
+        try:
+            for future in as_completed(futures):
+                day_iso, partial = future.result()
+                month = month_start(date.fromisoformat(day_iso))
+                rollup.merge(merged[month], partial)
+                remaining[month] -= 1
+                done_days += 1
+
+                if remaining[month] == 0:
+                    count = rollup.write_month(db, month, merged.pop(month))
+                    completed.add(month.isoformat())
+                    processed.append(month)
+                    if checkpoint_path:
+                        save_checkpoint(checkpoint_path, rollup.name, completed)
+                    elapsed = time.monotonic() - started
+                    print(f"[{done_days}/{total_days} 天, {elapsed:.1f}s] "
+                          f"{month.strftime('%Y-%m')} 写入 {count} 行")
+        finally:
+            db.close()
+
+    return processed
+
+
+def report_verification(checked, mismatches):
+    """输出抽样校验结果"""
+    if not mismatches:
+        print(f"抽样校验 {checked} 行，全部一致")
+        return
+    print(f"抽样校验 {checked} 行，{len(mismatches)} 行不一致:")
+    for mismatch in mismatches:
+        print(f"  {json.dumps(mismatch, ensure_ascii=False)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="并行回填 / 重建汇总表")
+    parser.add_argument("--rollup", choices=sorted(ROLLUPS), default=EmployeeMonthlyRollup.name,
+                        help="要回填的汇总表")
+    parser.add_argument("--start", help="开始日期（YYYY-MM-DD），默认最早一条记录")
+    parser.add_argument("--end", help="结束日期（YYYY-MM-DD），默认最晚一条记录")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="进程数")
+    parser.add_argument("--checkpoint", help="检查点文件，默认 backfill_<汇总表>.json")
+    parser.add_argument("--rebuild", action="store_true", help="忽略检查点，全部重新计算")
+    parser.add_argument("--verify", type=int, default=20, help="回填后抽样校验的行数（0 表示不校验）")
+    parser.add_argument("--verify-only", type=int, metavar="N", help="只抽样校验 N 行，不回填")
+    args = parser.parse_args()
+
+    rollup = ROLLUPS[args.rollup]
+    checkpoint_path = args.checkpoint or f"backfill_{rollup.name}.json"
+
+    if args.verify_only:
+        db = SessionLocal()
+        try:
+            checked, mismatches = rollup.verify_sample(db, args.verify_only)
+        finally:
+            db.close()
+        report_verification(checked, mismatches)
+        sys.exit(1 if mismatches else 0)
+
+    first, last = history_range()
+    if first is None:
+        print("没有就餐记录，无需回填")
+        return
+    start = date.fromisoformat(args.start) if args.start else first
+    end = date.fromisoformat(args.end) if args.end else last
+
+    processed = backfill(rollup, start, end, max(args.workers, 1), checkpoint_path, args.rebuild)
+
+    if args.verify > 0 and processed:
+        db = SessionLocal()
+        try:
+            checked, mismatches = rollup.verify_sample(db, args.verify, processed)
+        finally:
+            db.close()
+        report_verification(checked, mismatches)
+        if mismatches:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -42,17 +42,26 @@ def init_database():
             
             # 创建表
             tables = {
+                'employees': """
+                    CREATE TABLE employees (
+                        employee_id VARCHAR(50) PRIMARY KEY,
+                        employee_name VARCHAR(50),
+                        avatar_url VARCHAR(200),
+                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+                    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+                """,
                 'dining_records': """
                     CREATE TABLE dining_records (
                         id INT AUTO_INCREMENT PRIMARY KEY,
                         employee_id VARCHAR(50),
-                        employee_name VARCHAR(50),
-                        avatar_url VARCHAR(200),
                         payment_time DATETIME,
+                        exit_time DATETIME NULL,
                         payment_amount DECIMAL(10, 2),
                         dishes JSON,
                         created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                        INDEX idx_payment_time (payment_time)
+                        INDEX idx_payment_time (payment_time),
+                        INDEX idx_employee_payment_time (employee_id, payment_time)
                     ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
                 """,
                 'satisfaction': """
@@ -63,6 +72,19 @@ def init_database():
                         created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                         INDEX idx_created_at (created_at)
                     ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+                """,
+                'employee_monthly_stats': """
+                    CREATE TABLE employee_monthly_stats (
+                        id INT AUTO_INCREMENT PRIMARY KEY,
+                        employee_id VARCHAR(50) NOT NULL,
+                        month DATE NOT NULL,
+                        visit_count INT NOT NULL DEFAULT 0,
+                        total_spend DECIMAL(12, 2) NOT NULL DEFAULT 0,
+                        dish_counts JSON,
+                        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+                        UNIQUE INDEX uk_employee_month (employee_id, month),
+                        INDEX idx_month (month)
+                    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
                 """
             }
             
@@ -96,6 +118,9 @@ def generate_mock_data(cursor):
         # 生成今天不同时段的就餐记录
         current_date = datetime.now().date()
         
+        # 员工月度汇总 {(员工ID, 月份): [就餐次数, 消费总额, {菜品名: 次数}]}
+        monthly_stats = {}
+        
         # 生成不同时段的就餐记录
         for hour in range(7, 20):  # 从早上7点到晚上8点
             # 每个小时生成多条记录
@@ -119,23 +144,48 @@ def generate_mock_data(cursor):
                 # 计算总金额
                 total_amount = sum(dish["price"] for dish in meal_dishes)
                 
+                # 写入员工信息（员工维度表）
+                cursor.execute("""
+                    INSERT INTO employees (employee_id, employee_name)
+                    VALUES (%s, %s)
+                    ON DUPLICATE KEY UPDATE employee_name = VALUES(employee_name)
+                """, (employee_id, employee_name))
+                
                 # 插入就餐记录
                 cursor.execute("""
                     INSERT INTO dining_records 
-                    (employee_id, employee_name, payment_time, payment_amount, dishes)
-                    VALUES (%s, %s, %s, %s, %s)
+                    (employee_id, payment_time, payment_amount, dishes)
+                    VALUES (%s, %s, %s, %s)
                 """, (
                     employee_id,
-                    employee_name,
                     current_time,
                     total_amount,
                     json.dumps(meal_dishes)
                 ))
                 
                 print(f"生成就餐记录: {employee_name} 在 {current_time} 消费 {total_amount}")
+                
+                # 累计员工月度汇总
+                stats = monthly_stats.setdefault(
+                    (employee_id, current_date.replace(day=1)), [0, 0.0, {}]
+                )
+                stats[0] += 1
+                stats[1] += total_amount
+                for dish in meal_dishes:
+                    stats[2][dish["name"]] = stats[2].get(dish["name"], 0) + 1
         
         print("成功生成就餐记录")
         
+        # 写入员工月度汇总
+        for (employee_id, month), (visit_count, total_spend, dish_counts) in monthly_stats.items():
+            cursor.execute("""
+                INSERT INTO employee_monthly_stats
+                (employee_id, month, visit_count, total_spend, dish_counts)
+                VALUES (%s, %s, %s, %s, %s)
+            """, (employee_id, month, visit_count, total_spend, json.dumps(dish_counts, ensure_ascii=False)))
+        
+        print("成功生成员工月度汇总")
+        
         # 生成满意度评价数据
         print("开始生成满意度评价数据...")
         
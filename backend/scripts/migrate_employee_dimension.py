@@ -0,0 +1,86 @@
+import mysql.connector
+from mysql.connector import Error
+import os
+from dotenv import load_dotenv
+
+# 加载环境变量
+load_dotenv()
+
+def get_db_config():
+    """获取数据库配置"""
+    return {
+        'host': os.getenv("DB_HOST"),
+        'user': os.getenv("DB_USER"),
+        'password': os.getenv("DB_PASSWORD"),
+        'database': os.getenv("DB_NAME")
+    }
+
+def column_exists(cursor, table, column):
+    """检查表中是否存在指定列"""
+    cursor.execute("""
+        SELECT COUNT(*) FROM information_schema.columns
+        WHERE table_schema = DATABASE() AND table_name = %s AND column_name = %s
+    """, (table, column))
+    return cursor.fetchone()[0] > 0
+
+def migrate(cursor):
+    """将员工姓名、头像从 dining_records 迁移到 employees 维度表"""
+    # 创建员工维度表
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS employees (
+            employee_id VARCHAR(50) PRIMARY KEY,
+            employee_name VARCHAR(50),
+            avatar_url VARCHAR(200),
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+    """)
+    print("表 employees 已就绪")
+
+    if not column_exists(cursor, 'dining_records', 'employee_name'):
+        print("dining_records 已不包含员工姓名列，无需迁移")
+        return
+
+    # 每个员工取最近一次就餐记录中的姓名和头像
+    cursor.execute("""
+        INSERT INTO employees (employee_id, employee_name, avatar_url)
+        SELECT r.employee_id, r.employee_name, r.avatar_url
+        FROM dining_records r
+        JOIN (
+            SELECT employee_id, MAX(id) AS last_id
+            FROM dining_records
+            WHERE employee_id IS NOT NULL
+            GROUP BY employee_id
+        ) latest ON latest.last_id = r.id
+        ON DUPLICATE KEY UPDATE
+            employee_name = VALUES(employee_name),
+            avatar_url = COALESCE(VALUES(avatar_url), employees.avatar_url)
+    """)
+    print(f"写入员工信息 {cursor.rowcount} 行")
+
+    # 删除就餐记录中的冗余列
+    cursor.execute("ALTER TABLE dining_records DROP COLUMN employee_name, DROP COLUMN avatar_url")
+    print("已删除 dining_records.employee_name 和 dining_records.avatar_url")
+
+def main():
+    """主函数"""
+    config = get_db_config()
+    connection = None
+    try:
+        connection = mysql.connector.connect(**config)
+        cursor = connection.cursor()
+        migrate(cursor)
+        connection.commit()
+        cursor.close()
+        print("迁移完成！")
+    except Error as e:
+        print(f"迁移出错: {e}")
+        if connection:
+            connection.rollback()
+    finally:
+        if connection and connection.is_connected():
+            connection.close()
+            print("数据库连接已关闭")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+import mysql.connector
+from mysql.connector import Error
+import os
+from dotenv import load_dotenv
+
+# 加载环境变量
+load_dotenv()
+
+def get_db_config():
+    """获取数据库配置"""
+    return {
+        'host': os.getenv("DB_HOST"),
+        'user': os.getenv("DB_USER"),
+        'password': os.getenv("DB_PASSWORD"),
+        'database': os.getenv("DB_NAME")
+    }
+
+def table_exists(cursor, table):
+    """检查表是否存在"""
+    cursor.execute("""
+        SELECT COUNT(*) FROM information_schema.tables
+        WHERE table_schema = DATABASE() AND table_name = %s
+    """, (table,))
+    return cursor.fetchone()[0] > 0
+
+def index_exists(cursor, table, index):
+    """检查表中是否存在指定索引"""
+    cursor.execute("""
+        SELECT COUNT(*) FROM information_schema.statistics
+        WHERE table_schema = DATABASE() AND table_name = %s AND index_name = %s
+    """, (table, index))
+    return cursor.fetchone()[0] > 0
+
+def migrate(cursor):
+    """为已有数据库创建员工月度汇总表和 (employee_id, payment_time) 索引"""
+    created = False
+    if table_exists(cursor, 'employee_monthly_stats'):
+        print("表 employee_monthly_stats 已存在")
+    else:
+        cursor.execute("""
+            CREATE TABLE employee_monthly_stats (
+                id INT AUTO_INCREMENT PRIMARY KEY,
+                employee_id VARCHAR(50) NOT NULL,
+                month DATE NOT NULL,
+                visit_count INT NOT NULL DEFAULT 0,
+                total_spend DECIMAL(12, 2) NOT NULL DEFAULT 0,
+                dish_counts JSON,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+                UNIQUE INDEX uk_employee_month (employee_id, month),
+                INDEX idx_month (month)
+            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+        """)
+        created = True
+        print("已创建表 employee_monthly_stats")
+
+    if index_exists(cursor, 'dining_records', 'idx_employee_payment_time'):
+        print("dining_records 已包含索引 idx_employee_payment_time")
+    else:
+        cursor.execute("CREATE INDEX idx_employee_payment_time ON dining_records (employee_id, payment_time)")
+        print("已创建索引 dining_records.idx_employee_payment_time")
+
+    if created:
+        # 新写入的记录会增量累加，历史数据需要整月回填（回填按月替换，与增量更新结果一致）
+        print("请执行 python scripts/backfill_rollups.py --rebuild 回填历史月度汇总")
+
+def main():
+    """主函数"""
+    config = get_db_config()
+    connection = None
+    try:
+        connection = mysql.connector.connect(**config)
+        cursor = connection.cursor()
+        migrate(cursor)
+        connection.commit()
+        cursor.close()
+        print("迁移完成！")
+    except Error as e:
+        print(f"迁移出错: {e}")
+        if connection:
+            connection.rollback()
+    finally:
+        if connection and connection.is_connected():
+            connection.close()
+            print("数据库连接已关闭")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+import mysql.connector
+from mysql.connector import Error
+import os
+from dotenv import load_dotenv
+
+# 加载环境变量
+load_dotenv()
+
+def get_db_config():
+    """获取数据库配置"""
+    return {
+        'host': os.getenv("DB_HOST"),
+        'user': os.getenv("DB_USER"),
+        'password': os.getenv("DB_PASSWORD"),
+        'database': os.getenv("DB_NAME")
+    }
+
+def column_exists(cursor, table, column):
+    """检查表中是否存在指定列"""
+    cursor.execute("""
+        SELECT COUNT(*) FROM information_schema.columns
+        WHERE table_schema = DATABASE() AND table_name = %s AND column_name = %s
+    """, (table, column))
+    return cursor.fetchone()[0] > 0
+
+def migrate(cursor):
+    """为已有数据库的 dining_records 增加出闸时间列"""
+    if column_exists(cursor, 'dining_records', 'exit_time'):
+        print("dining_records 已包含 exit_time 列，无需迁移")
+        return
+
+    # 历史记录没有出闸数据，保持 NULL，在场人数按固定就餐时长估算
+    cursor.execute("ALTER TABLE dining_records ADD COLUMN exit_time DATETIME NULL AFTER payment_time")
+    print("已添加 dining_records.exit_time")
+
+def main():
+    """主函数"""
+    config = get_db_config()
+    connection = None
+    try:
+        connection = mysql.connector.connect(**config)
+        cursor = connection.cursor()
+        migrate(cursor)
+        connection.commit()
+        cursor.close()
+        print("迁移完成！")
+    except Error as e:
+        print(f"迁移出错: {e}")
+        if connection:
+            connection.rollback()
+    finally:
+        if connection and connection.is_connected():
+            connection.close()
+            print("数据库连接已关闭")
+
+if __name__ == "__main__":
+    main()
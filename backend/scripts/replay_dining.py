@@ -0,0 +1,408 @@
+"""就餐高峰回放工具
+
+将一天的就餐记录（录制文件或按早/午/晚高峰分布生成）按 N 倍速通过
+POST /api/dining/records 写入正在运行的服务，同时模拟多块大屏轮询
+所有数据接口，统计写入延迟、读取延迟分位数以及大屏数据的滞后情况。
+
+使用示例（本地 SQLite 替身库，服务端关闭随机模拟数据）:
+    python scripts/replay_dining.py --init-db sqlite:///replay.db
+    DATABASE_URL=sqlite:///replay.db SIMULATE_DINING=false uvicorn main:app --port 8000
+    python scripts/replay_dining.py --speed 60 --clients 20
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+import httpx
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# 大屏轮询的接口
+DASHBOARD_ENDPOINTS = [
+    "/api/dining/trend",
+    "/api/dining/revenue",
+    "/api/dining/realtime",
+    "/api/dining/occupancy/peak",
+    "/api/dish/analysis",
+    "/api/satisfaction/stats"
+]
+
+# 各就餐时段 (开始小时, 高峰小时, 结束小时, 人数占比)
+MEAL_PERIODS = [
+    (7.0, 7.75, 9.0, 0.2),
+    (11.0, 12.0, 13.5, 0.5),
+    (17.0, 18.0, 19.5, 0.3)
+]
+
+
+def percentile(values, p):
+    """计算分位数（最近秩法）"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(p / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+def summarize(values):
+    """返回 p50/p95/p99/max（毫秒）"""
+    if not values:
+        return {"count": 0}
+    return {
+        "count": len(values),
+        "p50": round(percentile(values, 50), 1),
+        "p95": round(percentile(values, 95), 1),
+        "p99": round(percentile(values, 99), 1),
+        "max": round(max(values), 1)
+    }
+
+
+def generate_day(day, total):
+    """按早/午/晚高峰的三角分布生成一天的就餐记录"""
+    from app.utils.dining_simulator import DiningSimulator
+    simulator = DiningSimulator()
+    day_start = datetime.combine(day, datetime.min.time())
+    events = []
+    for _ in range(total):
+        start, peak, end, _ = random.choices(MEAL_PERIODS, weights=[p[3] for p in MEAL_PERIODS])[0]
+        hour = random.triangular(start, end, peak)
+        record = simulator.generate_record()
+        record["payment_time"] = day_start + timedelta(hours=hour)
+        record["exit_time"] = record["payment_time"] + timedelta(minutes=random.uniform(10, 35))
+        events.append(record)
+    events.sort(key=lambda r: r["payment_time"])
+    return events
+
+
+def load_events(path):
+    """读取录制的就餐记录（NDJSON 或 JSON 数组）"""
+    with open(path, encoding="utf-8") as f:
+        content = f.read().strip()
+    if content.startswith("["):
+        rows = json.loads(content)
+    else:
+        rows = [json.loads(line) for line in content.splitlines() if line.strip()]
+    for row in rows:
+        for field in ("payment_time", "exit_time"):
+            if row.get(field):
+                row[field] = datetime.fromisoformat(str(row[field]).replace(" ", "T"))
+    rows.sort(key=lambda r: r["payment_time"])
+    return rows
+
+
+def save_events(path, events):
+    """保存生成的就餐记录，便于重复回放"""
+    with open(path, "w", encoding="utf-8") as f:
+        for event in events:
+            f.write(json.dumps(event, ensure_ascii=False, default=str) + "\n")
+
+
+def init_db(url):
+    """在替身库中创建所有表"""
+    os.environ["DATABASE_URL"] = url
+    from app.models.database import Base, engine
+    import app.models.canteen  # noqa: F401  注册所有模型
+    Base.metadata.create_all(engine)
+    print(f"已在 {url} 创建数据表")
+
+
+class ReplayStats:
+    """回放过程中收集的指标"""
+
+    def __init__(self):
+        self.ingest_lag = []        # (发送时刻, 写入延迟ms)
+        self.ingest_errors = 0
+        self.reads = {}             # 接口 -> [(请求时刻, 延迟ms)]
+        self.read_errors = {}
+        self.staleness = {}         # 接口 -> [(请求时刻, 落后条数, 落后秒数)]
+        self.ack_times = []         # 每条今日记录被确认写入的时刻
+        self.ack_dishes = []        # 与 ack_times 对应的累计菜品数
+
+
+async def ingest(client, events, speed, keep_timestamps, tick, stats, t0):
+    """按倍速写入就餐记录，同一 tick 内到期的记录合并为一次请求"""
+    first = events[0]["payment_time"]
+    today = datetime.now().date()
+    pending = set()
+    dish_total = 0
+    i = 0
+
+    async def send(batch, scheduled):
+        nonlocal dish_total
+        now = datetime.now()
+        payload = []
+        for event in batch:
+            record = dict(event)
+            if not keep_timestamps:
+                # 改写为当前时间，使回放数据落在大屏的“今天/最近2小时”窗口内
+                shift = now - record["payment_time"]
+                record["payment_time"] = now
+                if record.get("exit_time"):
+                    record["exit_time"] = record["exit_time"] + shift
+            payload.append({
+                key: value.isoformat() if isinstance(value, datetime) else value
+                for key, value in record.items()
+            })
+        try:
+            response = await client.post("/api/dining/records", json={"records": payload})
+            ok = response.status_code == 200 and response.json().get("code") == 200
+        except Exception as e:
+            print(f"写入失败: {e}")
+            ok = False
+        acked = time.monotonic()
+        if not ok:
+            stats.ingest_errors += len(batch)
+            return
+        for event, record in zip(batch, payload):
+            stats.ingest_lag.append((scheduled - t0, (acked - scheduled) * 1000))
+            if keep_timestamps and event["payment_time"].date() != today:
+                continue
+            dish_total += len(record["dishes"])
+            stats.ack_times.append(acked)
+            stats.ack_dishes.append(dish_total)
+
+    while i < len(events):
+        scheduled = t0 + (events[i]["payment_time"] - first).total_seconds() / speed
+        delay = scheduled - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        # 收集 tick 内到期的所有记录
+        batch = []
+        horizon = time.monotonic() + tick
+        while i < len(events):
+            due = t0 + (events[i]["payment_time"] - first).total_seconds() / speed
+            if due > horizon:
+                break
+            batch.append(events[i])
+            i += 1
+        task = asyncio.ensure_future(send(batch, scheduled))
+        pending.add(task)
+        task.add_done_callback(pending.discard)
+
+    if pending:
+        await asyncio.gather(*pending)
+
+
+def observed_count(endpoint, body):
+    """从接口响应中取出可与已写入记录比对的累计值"""
+    data = body.get("data") or {}
+    if endpoint == "/api/dining/realtime":
+        return "records", data.get("total_dining")
+    if endpoint == "/api/dish/analysis":
+        return "dishes", (data.get("stats") or {}).get("total_sales")
+    return None, None
+
+
+async def poll(client, interval, stats, baselines, stop, t0):
+    """模拟一块大屏：每个周期并发请求所有接口"""
+    async def fetch(endpoint):
+        acked_before = len(stats.ack_times)
+        dishes_before = stats.ack_dishes[-1] if stats.ack_dishes else 0
+        started = time.monotonic()
+        try:
+            response = await client.get(endpoint)
+            body = response.json()
+        except Exception:
+            stats.read_errors[endpoint] = stats.read_errors.get(endpoint, 0) + 1
+            return
+        elapsed = (time.monotonic() - started) * 1000
+        stats.reads.setdefault(endpoint, []).append((started - t0, elapsed))
+        if body.get("code") != 200:
+            stats.read_errors[endpoint] = stats.read_errors.get(endpoint, 0) + 1
+            return
+
+        kind, value = observed_count(endpoint, body)
+        if kind is None or value is None or endpoint not in baselines:
+            return
+        reflected = value - baselines[endpoint]
+        if kind == "records":
+            behind = max(0, acked_before - reflected)
+            # 最早一条未体现的记录被确认写入至今的时间
+            age = started - stats.ack_times[acked_before - behind] if behind else 0.0
+        else:
+            behind = max(0, dishes_before - reflected)
+            age = 0.0
+            if behind:
+                # 找到第一条累计菜品数超过已体现数量的记录
+                for ack_time, total in zip(stats.ack_times, stats.ack_dishes):
+                    if total > reflected:
+                        age = started - ack_time
+                        break
+        stats.staleness.setdefault(endpoint, []).append((started - t0, behind, age))
+
+    # 各大屏错开启动，避免所有请求完全同步
+    await asyncio.sleep(random.uniform(0, interval))
+    while not stop.is_set():
+        await asyncio.gather(*(fetch(endpoint) for endpoint in DASHBOARD_ENDPOINTS))
+        try:
+            await asyncio.wait_for(stop.wait(), timeout=interval)
+        except asyncio.TimeoutError:
+            pass
+
+
+async def read_baselines(client):
+    """回放开始前读取各累计值，后续按增量比对"""
+    baselines = {}
+    for endpoint in DASHBOARD_ENDPOINTS:
+        try:
+            body = (await client.get(endpoint)).json()
+        except Exception as e:
+            print(f"读取 {endpoint} 基线失败: {e}")
+            continue
+        kind, value = observed_count(endpoint, body)
+        if kind is not None and value is not None:
+            baselines[endpoint] = value
+    return baselines
+
+
+def window_report(stats, start, end):
+    """统计 [start, end) 时间窗口内的指标"""
+    lag = [v for t, v in stats.ingest_lag if start <= t < end]
+    reads = [v for samples in stats.reads.values() for t, v in samples if start <= t < end]
+    staleness = [
+        (behind, age) for samples in stats.staleness.values()
+        for t, behind, age in samples if start <= t < end
+    ]
+    return {
+        "window": f"{start:>6.0f}s",
+        "ingested": len(lag),
+        "ingest_p95": summarize(lag).get("p95"),
+        "read_p50": summarize(reads).get("p50"),
+        "read_p95": summarize(reads).get("p95"),
+        "max_behind": max((b for b, _ in staleness), default=0),
+        "max_stale_s": round(max((a for _, a in staleness), default=0.0), 2)
+    }
+
+
+async def reporter(stats, interval, stop, t0):
+    """定期输出时间窗口内的指标"""
+    print(f"{'时间窗口':>8} {'写入数':>6} {'写入p95(ms)':>12} {'读p50(ms)':>10} "
+          f"{'读p95(ms)':>10} {'最多落后':>8} {'最大滞后(s)':>12}")
+    window_start = 0.0
+    while not stop.is_set():
+        try:
+            await asyncio.wait_for(stop.wait(), timeout=interval)
+        except asyncio.TimeoutError:
+            pass
+        window_end = time.monotonic() - t0
+        row = window_report(stats, window_start, window_end)
+        print(f"{row['window']:>8} {row['ingested']:>6} {str(row['ingest_p95']):>12} "
+              f"{str(row['read_p50']):>10} {str(row['read_p95']):>10} "
+              f"{row['max_behind']:>8} {row['max_stale_s']:>12}")
+        window_start = window_end
+
+
+async def replay(args, events):
+    stop = asyncio.Event()
+    stats = ReplayStats()
+    limits = httpx.Limits(max_connections=args.clients * len(DASHBOARD_ENDPOINTS) + 20)
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=30.0, limits=limits) as client:
+        baselines = await read_baselines(client)
+        t0 = time.monotonic()
+        pollers = [
+            asyncio.ensure_future(poll(client, args.poll_interval, stats, baselines, stop, t0))
+            for _ in range(args.clients)
+        ]
+        report_task = asyncio.ensure_future(reporter(stats, args.report_interval, stop, t0))
+
+        await ingest(client, events, args.speed, args.keep_timestamps, args.tick, stats, t0)
+        # 写入完成后继续轮询一段时间，观察数据追平
+        await asyncio.sleep(args.drain)
+        stop.set()
+        await asyncio.gather(*pollers, report_task)
+
+    duration = time.monotonic() - t0
+    return stats, duration
+
+
+def final_report(stats, duration):
+    """汇总整个回放过程的指标"""
+    report = {
+        "duration_s": round(duration, 1),
+        "ingest": {
+            **summarize([v for _, v in stats.ingest_lag]),
+            "errors": stats.ingest_errors,
+            "throughput_per_s": round(len(stats.ingest_lag) / duration, 1) if duration else 0
+        },
+        "reads": {
+            endpoint: {
+                **summarize([v for _, v in samples]),
+                "errors": stats.read_errors.get(endpoint, 0)
+            }
+            for endpoint, samples in stats.reads.items()
+        },
+        "staleness": {
+            endpoint: {
+                "max_behind": max((b for _, b, _ in samples), default=0),
+                "avg_behind": round(sum(b for _, b, _ in samples) / len(samples), 2) if samples else 0,
+                "max_stale_s": round(max((a for _, _, a in samples), default=0.0), 2),
+                "p95_stale_s": round(percentile([a for _, _, a in samples], 95) or 0.0, 2)
+            }
+            for endpoint, samples in stats.staleness.items()
+        }
+    }
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="按倍速回放一天的就餐记录并测量大屏接口表现")
+    parser.add_argument("--base-url", default="http://localhost:8000", help="服务地址")
+    parser.add_argument("--input", help="录制的就餐记录文件（NDJSON 或 JSON 数组），不指定则自动生成")
+    parser.add_argument("--records", type=int, default=2000, help="自动生成的记录数")
+    parser.add_argument("--date", help="自动生成记录的日期（YYYY-MM-DD），默认今天")
+    parser.add_argument("--save", help="将生成的记录保存到文件")
+    parser.add_argument("--speed", type=float, default=60.0, help="回放倍速")
+    parser.add_argument("--tick", type=float, default=0.05, help="合并为一次写入请求的时间片（秒）")
+    parser.add_argument("--clients", type=int, default=10, help="模拟的大屏数量")
+    parser.add_argument("--poll-interval", type=float, default=5.0, help="大屏轮询间隔（秒）")
+    parser.add_argument("--report-interval", type=float, default=10.0, help="输出统计的间隔（秒）")
+    parser.add_argument("--drain", type=float, default=10.0, help="写入结束后继续轮询的时间（秒）")
+    parser.add_argument("--keep-timestamps", action="store_true",
+                        help="保留原始就餐时间（默认改写为发送时刻）")
+    parser.add_argument("--init-db", metavar="URL", help="在指定替身库中建表后退出")
+    parser.add_argument("--json-report", help="将最终统计写入 JSON 文件")
+    args = parser.parse_args()
+
+    if args.init_db:
+        init_db(args.init_db)
+        return
+
+    if args.input:
+        events = load_events(args.input)
+    else:
+        day = datetime.strptime(args.date, "%Y-%m-%d").date() if args.date else datetime.now().date()
+        events = generate_day(day, args.records)
+        if args.save:
+            save_events(args.save, events)
+    if not events:
+        print("没有可回放的记录")
+        return
+
+    span = (events[-1]["payment_time"] - events[0]["payment_time"]).total_seconds()
+    print(f"回放 {len(events)} 条记录，原始跨度 {span / 3600:.1f} 小时，"
+          f"{args.speed:g} 倍速约 {span / args.speed:.0f} 秒，{args.clients} 块大屏")
+
+    stats, duration = asyncio.run(replay(args, events))
+    report = final_report(stats, duration)
+
+    print("\n写入延迟(ms):", report["ingest"])
+    print("读取延迟(ms):")
+    for endpoint, summary in report["reads"].items():
+        print(f"  {endpoint}: {summary}")
+    print("数据滞后:")
+    for endpoint, summary in report["staleness"].items():
+        print(f"  {endpoint}: {summary}")
+
+    if args.json_report:
+        with open(args.json_report, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"统计结果已写入 {args.json_report}")
+
+
+if __name__ == "__main__":
+    main()